@@ -1,4 +1,300 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import glob
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+import queue
+import re
+import struct
 import sys
+import threading
+import zlib
+
+import numpy as np
+
+# A=0 C=1 G=2 T=3, anything else (N, IUPAC codes, gaps) is the sentinel 4
+codeBases = b'ACGTN'
+nCode = 4
+baseCode = np.full(256, nCode, dtype=np.uint8)
+baseCode[np.frombuffer(b'ACGTacgt', dtype=np.uint8)] = [0, 1, 2, 3, 0, 1, 2, 3]
+
+
+def encodeSequence (sequence):
+    '''
+    Encode a sequence as one uint8 code per base.
+
+    Args:
+        sequence (str or bytes): The bases, in either case.
+
+    Returns:
+        np.ndarray: uint8 codes A=0 C=1 G=2 T=3, other symbols as nCode.
+    '''
+    if isinstance(sequence, str):
+        sequence = sequence.encode('latin-1')
+    return baseCode[np.frombuffer(sequence, dtype=np.uint8)]
+
+
+def decodeSequence (codes):
+    '''
+    Args:
+        codes (np.ndarray): uint8 codes from encodeSequence.
+
+    Returns:
+        str: The bases, with the sentinel shown as N.
+    '''
+    return np.frombuffer(codeBases, dtype=np.uint8)[codes].tobytes().decode('ascii')
+
+
+def splitmix64 (x):
+    '''
+    splitmix64 finaliser on a uint64 array; overflow wraps as intended.
+    Spreads 2 bit k-mer codes evenly over 64 bits for hashing.
+
+    Args:
+        x (np.ndarray): uint64 values.
+
+    Returns:
+        np.ndarray: uint64 hashes.
+    '''
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def runIntervals (flags):
+    '''
+    Run length encode a boolean array in one vectorized pass.
+
+    Args:
+        flags (np.ndarray): bool array.
+
+    Returns:
+        np.ndarray: int64 array of shape (runs, 2) holding the [start, end)
+            of every run of True values.
+    '''
+    padded = np.concatenate(([False], flags, [False]))
+    return np.flatnonzero(padded[1:] != padded[:-1]).reshape(-1, 2)
+
+
+def unmaskedIntervals (length, maskRuns):
+    '''
+    Args:
+        length (int): Sequence length.
+        maskRuns (np.ndarray): Sorted [start, end) runs, as from runIntervals.
+
+    Returns:
+        np.ndarray: int64 array of shape (runs, 2) holding the [start, end)
+            of every non-empty gap between the mask runs.
+    '''
+    bounds = np.concatenate(([0], np.asarray(maskRuns, dtype=np.int64).reshape(-1), [length])).reshape(-1, 2)
+    return bounds[bounds[:, 0] < bounds[:, 1]]
+
+
+# complement of every code, the N sentinel stays N
+complementCode = np.array([3, 2, 1, 0, nCode], dtype=np.uint8)
+
+
+class StrandView:
+    '''
+    One strand of an encoded sequence, without copying the sequence.
+
+    The reverse strand is a negative stride view of the forward codes.
+    Slices and k-mers of it are complemented through complementCode only
+    when they are asked for, so analysing both strands of a chromosome
+    costs no extra whole-genome copy. reverseComplement builds a full copy
+    chunk by chunk for code that really needs one.
+    '''
+
+    def __init__ (self, codes, reverse=False):
+        '''
+        Constructor for StrandView.
+
+        Args:
+            codes (np.ndarray): Forward strand uint8 codes from encodeSequence.
+            reverse (bool): Optional. View the reverse complement strand.
+        '''
+        self.codes = codes
+        self.isReverse = reverse
+        self.view = codes[::-1] if reverse else codes
+
+    def other (self):
+        '''
+        Returns:
+            StrandView: The opposite strand of the same codes.
+        '''
+        return StrandView(self.codes, not self.isReverse)
+
+    def __len__ (self):
+        return len(self.codes)
+
+    def __getitem__ (self, where):
+        '''
+        Args:
+            where (int or slice): Position(s) in this strand's 5' to 3' order.
+
+        Returns:
+            np.ndarray or int: Codes of this strand; a view on the forward
+                strand, a window sized copy on the reverse strand.
+        '''
+        if self.isReverse:
+            return complementCode[self.view[where]]
+        return self.view[where]
+
+    def kmer (self, start, k):
+        '''
+        Args:
+            start (int): Start of the k-mer on this strand.
+            k (int): k-mer length.
+
+        Returns:
+            np.ndarray: The k codes.
+        '''
+        return self[start:start + k]
+
+    def kmerString (self, start, k):
+        '''
+        Returns:
+            str: The k-mer at start as bases.
+        '''
+        return decodeSequence(self.kmer(start, k))
+
+    def reverseComplement (self, chunk=1 << 20):
+        '''
+        Materialise the opposite strand.
+
+        Args:
+            chunk (int): Optional. Codes complemented per np.take call, which
+                keeps the temporary memory to one chunk.
+
+        Returns:
+            np.ndarray: A new array holding the other strand's codes.
+        '''
+        if self.isReverse:
+            return self.codes.copy()
+        out = np.empty(len(self.codes), dtype=np.uint8)
+        source = self.codes[::-1]
+        for start in range(0, len(out), chunk):
+            np.take(complementCode, source[start:start + chunk], out=out[start:start + chunk])
+        return out
+
+
+class TwoBitSequence:
+    '''
+    A sequence packed four bases to the byte, first base in the high bits.
+
+    Two bits can not hold the N sentinel, so as in the UCSC .2bit format
+    the runs of non ACGT symbols are kept separately as [start, end)
+    intervals and restored by unpack.
+    '''
+
+    def __init__ (self, packed, length, nRuns):
+        '''
+        Args:
+            packed (np.ndarray): uint8 array of (length + 3) // 4 bytes.
+            length (int): Number of bases.
+            nRuns (np.ndarray): int64 array of shape (runs, 2).
+        '''
+        self.packed = packed
+        self.length = length
+        self.nRuns = nRuns
+
+    def __len__ (self):
+        return self.length
+
+    @classmethod
+    def pack (cls, codes):
+        '''
+        Args:
+            codes (np.ndarray): uint8 codes from encodeSequence.
+
+        Returns:
+            TwoBitSequence: The packed form of codes.
+        '''
+        padded = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+        padded[:len(codes)] = codes & 3
+        quads = padded.reshape(-1, 4)
+        packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+        return cls(packed, len(codes), runIntervals(codes == nCode))
+
+    def unpack (self):
+        '''
+        Returns:
+            np.ndarray: uint8 codes, with the N runs restored.
+        '''
+        codes = np.empty((len(self.packed), 4), dtype=np.uint8)
+        for i, shift in enumerate((6, 4, 2, 0)):
+            codes[:, i] = (self.packed >> shift) & 3
+        codes = codes.reshape(-1)[:self.length]
+        for start, end in self.nRuns:
+            codes[start:end] = nCode
+        return codes
+
+
+class FastaBatch:
+    '''
+    A column batch of FastA records, laid out like an Arrow list array:
+    record i is data[offsets[i]:offsets[i + 1]] and is named headers[i].
+    '''
+
+    def __init__ (self, headers, data, offsets):
+        '''
+        Args:
+            headers (list): Record headers.
+            data (np.ndarray): uint8 bases of every record, back to back.
+            offsets (np.ndarray): int64 array of len(headers) + 1 boundaries.
+        '''
+        self.headers = headers
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def fromBytes (cls, headers, sequences, encoded=True):
+        '''
+        Args:
+            headers (list): Record headers.
+            sequences (list): Record sequences as upper cased bytes.
+            encoded (bool): Optional. Convert to encodeSequence codes.
+
+        Returns:
+            FastaBatch: The records joined into one buffer.
+        '''
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+        data = np.frombuffer(b''.join(sequences), dtype=np.uint8)
+        return cls(headers, baseCode[data] if encoded else data, offsets)
+
+    def __len__ (self):
+        return len(self.headers)
+
+    def lengths (self):
+        '''
+        Returns:
+            np.ndarray: The length of every record.
+        '''
+        return np.diff(self.offsets)
+
+    def sequence (self, i):
+        '''
+        Args:
+            i (int): Record number within the batch.
+
+        Returns:
+            np.ndarray: A view of record i, no copy is made.
+        '''
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__ (self):
+        for i, header in enumerate(self.headers):
+            yield header, self.sequence(i)
+
+
 class FastAreader :
 	
     def __init__ (self, fname=''):
@@ -6,12 +302,71 @@ class FastAreader :
         self.fname = fname
             
     def doOpen (self):
+        '''
+        Open the input as text, decompressing gzip or BGZF input on the fly.
+
+        Returns:
+            file: A text file handle.
+        '''
+        fileH = self.doOpenBinary()
+        if isinstance(fileH, (gzip.GzipFile, BgzfReader)):
+            return io.TextIOWrapper(fileH)
         if self.fname == '':
             return sys.stdin
+        # wrap the handle already open: reopening would lose the peeked bytes of a pipe
+        return io.TextIOWrapper(fileH)
+
+    def doOpenBinary (self):
+        '''
+        Open the input as a binary stream for block reads. Compressed input
+        is recognised by its magic bytes, so .gz and BGZF files (and pipes)
+        are read directly without a temporary decompressed copy.
+
+        Returns:
+            file: A binary file handle that supports readinto. A substituted
+                standard input that cannot peek is returned as it is, binary
+                buffer or text, without compression detection.
+        '''
+        if self.fname == '':
+            fileH = getattr(sys.stdin, 'buffer', sys.stdin)
+            if not hasattr(fileH, 'peek'):
+                return fileH
         else:
-            return open(self.fname)
+            fileH = open(self.fname, 'rb')
+        magic = fileH.peek(18)[:18]
+        if magic[:2] != b'\x1f\x8b':
+            return fileH
+        if BgzfReader.isBgzf(magic):
+            return BgzfReader(fileH)
+        gzipH = gzip.GzipFile(fileobj=fileH, mode='rb')
+        if self.fname != '':
+            gzipH.myfileobj = fileH     # so closing gzipH closes the file too
+        return gzipH
  
-    def readFasta (self):
+    def readFasta (self, bulk=False, encoding=None, cache=False, select=None):
+        '''
+        Read FastA sequences from the file.
+
+        Args:
+            bulk (bool): Optional. Parse with readFastaBulk instead of line
+                by line, which is much faster on long sequences.
+            encoding (str): Optional. 'uint8' yields the sequence as an
+                encodeSequence code array, '2bit' as a TwoBitSequence. Either
+                implies bulk parsing.
+            cache (bool): Optional. Keep the parsed records in a FastaCache
+                file beside the input and read them from there on later runs.
+                Implies bulk parsing.
+            select (callable): Optional. Called with each header; records it
+                rejects are skipped before their sequence is assembled. A
+                HeaderFilter covers the usual name, strand and range tests.
+                Implies bulk parsing.
+
+        Yields:
+            tuple: (header, sequence) for each record in the file.
+        '''
+        if bulk or encoding or cache or select:
+            yield from self.readFastaBulk(encoding=encoding, cache=cache, select=select)
+            return
 		
         header = ''
         sequence = ''
@@ -36,3 +391,1108 @@ class FastAreader :
                     sequence += ''.join(line.rstrip().split()).upper()
 						
         yield header,sequence
+
+    blockSize = 1 << 20
+    whitespace = b' \t\n\r\x0b\x0c'
+    upperTable = bytes.maketrans(bytes(range(97, 123)), bytes(range(65, 91)))
+
+    def readFastaBulk (self, blockSize=None, encoding=None, cache=False, select=None):
+        '''
+        Read FastA sequences in large binary blocks.
+
+        Record boundaries are found with bytes.find and each sequence is
+        joined once, then stripped of whitespace and upper cased by a single
+        bytes.translate, so the cost is linear in the file size instead of
+        growing with the square of the record length.
+
+        Args:
+            blockSize (int): Optional. Bytes read per readinto call.
+            encoding (str): Optional. None, 'uint8' or '2bit', see readFasta.
+            cache (bool): Optional. Read through a FastaCache, see readFasta.
+            select (callable): Optional. Header predicate, see readFasta.
+
+        Yields:
+            tuple: (header, sequence), exactly as readFasta yields them.
+        '''
+        if encoding not in (None, 'uint8', '2bit'):
+            raise ValueError(f"unknown sequence encoding '{encoding}'")
+        for header, sequence in self._byteRecords(blockSize, cache, select):
+            yield header, self._encode(sequence, encoding)
+
+    def readFastaMasked (self, blockSize=None, encoding=None, select=None):
+        '''
+        Read FastA records keeping their soft masking.
+
+        The sequence keeps its case (only whitespace is removed) and comes
+        with the lower case runs found by one vectorized comparison, so
+        consumers can skip repeat masked regions without case handling of
+        their own.
+
+        Args:
+            blockSize (int): Optional. Bytes read per readinto call.
+            encoding (str): Optional. None for the raw bytes, or 'uint8' or
+                '2bit' as in readFasta (codes ignore case).
+            select (callable): Optional. Header predicate, see readFasta.
+
+        Yields:
+            tuple: (header, sequence, maskRuns) where maskRuns is an int64
+                array of [start, end) lower case intervals.
+        '''
+        if encoding not in (None, 'uint8', '2bit'):
+            raise ValueError(f"unknown sequence encoding '{encoding}'")
+        for header, sequence in self._bulkSequences(blockSize, select, upper=False):
+            raw = np.frombuffer(sequence, dtype=np.uint8)
+            maskRuns = runIntervals((raw >= 97) & (raw <= 122))
+            yield header, sequence if encoding is None else self._encode(sequence, encoding), maskRuns
+
+    def readFastaBatches (self, maxRecords=4096, maxBases=1 << 24, encoded=True, cache=False, select=None):
+        '''
+        Read FastA records in column batches instead of one tuple per record.
+
+        Each FastaBatch holds up to maxRecords records and, unless a single
+        record is longer, up to maxBases bases, stored as one concatenated
+        uint8 array with an offsets array, so consumers can work on
+        thousands of short records per NumPy call.
+
+        Args:
+            maxRecords (int): Optional. Most records in one batch.
+            maxBases (int): Optional. Most bases in one batch.
+            encoded (bool): Optional. Store encodeSequence codes; if False
+                store the upper cased ASCII bytes.
+            cache (bool): Optional. Read through a FastaCache, see readFasta.
+            select (callable): Optional. Header predicate, see readFasta.
+
+        Yields:
+            FastaBatch: The next batch of records, in file order.
+        '''
+        headers = []
+        sequences = []
+        bases = 0
+        for header, sequence in self._byteRecords(None, cache, select):
+            if headers and (len(headers) >= maxRecords or bases + len(sequence) > maxBases):
+                yield FastaBatch.fromBytes(headers, sequences, encoded)
+                headers, sequences, bases = [], [], 0
+            headers.append(header)
+            sequences.append(sequence)
+            bases += len(sequence)
+        if headers:
+            yield FastaBatch.fromBytes(headers, sequences, encoded)
+
+    def readFastaSharded (self, workers=None, shards=None, ordered=True, encoding=None,
+                          batches=False, work=None, select=None):
+        '''
+        Parse the file in parallel, one byte range per task, on a process pool.
+
+        The file is cut into equal byte ranges, each snapped forward to the
+        next line starting with '>', so every record belongs to exactly one
+        shard. Workers map the file themselves and send back only the
+        records, or whatever work returns for them.
+
+        Args:
+            workers (int): Optional. Worker processes, defaults to the CPUs.
+            shards (int): Optional. Byte ranges, defaults to 4 per worker so
+                a slow shard does not hold up the pool.
+            ordered (bool): Optional. Yield in file order; if False yield
+                each shard as soon as it is finished.
+            encoding (str): Optional. None, 'uint8' or '2bit', see readFasta.
+            batches (bool): Optional. Yield one FastaBatch of encodeSequence
+                codes per shard instead of records.
+            work (callable): Optional. A module level function called in the
+                worker as work(header, sequence); its results are yielded in
+                place of the records. Not combined with batches.
+            select (callable): Optional. Picklable header predicate.
+
+        Yields:
+            tuple, FastaBatch or work results, see the arguments.
+        '''
+        if self.fname == '':
+            raise ValueError('sharded reading needs a file name, not stdin')
+        if encoding not in (None, 'uint8', '2bit'):
+            raise ValueError(f"unknown sequence encoding '{encoding}'")
+        with open(self.fname, 'rb') as fileH:
+            if fileH.peek(2)[:2] == b'\x1f\x8b':
+                raise ValueError(f'{self.fname} is compressed and can not be sharded')
+        size = os.path.getsize(self.fname)
+        workers = workers or os.cpu_count() or 1
+        shards = max(1, min(shards or 4 * workers, size))
+        bounds = [size * i // shards for i in range(shards + 1)]
+        tasks = [(self.fname, bounds[i], bounds[i + 1], encoding, batches, work, select)
+                 for i in range(shards)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parseShard, *task) for task in tasks]
+            for future in (futures if ordered else as_completed(futures)):
+                if batches:
+                    if len(future.result()):
+                        yield future.result()
+                else:
+                    yield from future.result()
+
+    def _byteRecords (self, blockSize=None, cache=False, select=None):
+        '''
+        Yields:
+            tuple: (header, sequence bytes) from the parser or the cache.
+        '''
+        if cache and self.fname != '':
+            fastaCache = FastaCache(self.fname)
+            records = fastaCache.read(select)
+            if records is None:
+                # the cache has to hold every record, so filter after saving
+                records = fastaCache.write(self._bulkSequences(blockSize))
+                if select is not None:
+                    records = ((header, sequence) for header, sequence in records if select(header))
+            return records
+        return self._bulkSequences(blockSize, select)
+
+    def _bulkSequences (self, blockSize=None, select=None, upper=True):
+        '''
+        Yields:
+            tuple: (header, sequence bytes) with whitespace removed and,
+                unless upper is False, the bases upper cased.
+        '''
+        for header, pieces in self._bulkRecords(blockSize, select):
+            yield header, FastaSplitter.join(pieces, upper)
+
+    @staticmethod
+    def _encode (sequence, encoding):
+        '''
+        Args:
+            sequence (bytes): Upper cased bases without whitespace.
+            encoding (str): None, 'uint8' or '2bit'.
+
+        Returns:
+            str, np.ndarray or TwoBitSequence: sequence in the requested form.
+        '''
+        if encoding is None:
+            return sequence.decode('latin-1')
+        codes = baseCode[np.frombuffer(sequence, dtype=np.uint8)]
+        if encoding == '2bit':
+            return TwoBitSequence.pack(codes)
+        return codes
+
+    def _bulkRecords (self, blockSize=None, select=None):
+        '''
+        Split the binary input into records.
+
+        Args:
+            blockSize (int): Optional. Bytes read per readinto call.
+            select (callable): Optional. Header predicate; the body chunks of
+                rejected records are never copied out of the read buffer.
+
+        Yields:
+            tuple: (header, list of raw body chunks)
+        '''
+        buf = bytearray(blockSize or self.blockSize)
+        view = memoryview(buf)
+        splitter = FastaSplitter(select)
+        with self.doOpenBinary() as fileH:
+            n = fileH.readinto(buf)
+            while n:
+                yield from splitter.feed(view[:n])
+                n = fileH.readinto(buf)
+        yield from splitter.finish()
+
+
+def _snapToRecord (mm, pos):
+    '''
+    Args:
+        mm (mmap.mmap): The mapped FastA file.
+        pos (int): A byte position.
+
+    Returns:
+        int: The first record start at or after pos, or len(mm).
+    '''
+    if pos == 0 and mm[:1] == b'>':
+        return 0
+    mark = mm.find(b'\n>', max(pos - 1, 0))
+    return len(mm) if mark < 0 else mark + 1
+
+
+def _parseShard (fname, start, end, encoding, batches, work, select):
+    '''
+    Worker for FastAreader.readFastaSharded: parse the records whose header
+    starts in the byte range [start, end).
+
+    Returns:
+        list or FastaBatch: The shard's records, work results or batch.
+    '''
+    with open(fname, 'rb') as fileH:
+        if os.fstat(fileH.fileno()).st_size == 0:
+            return FastaBatch.fromBytes([], []) if batches else []
+        mm = mmap.mmap(fileH.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        first = _snapToRecord(mm, start)
+        last = _snapToRecord(mm, end) if end < len(mm) else len(mm)
+        splitter = FastaSplitter(select)
+        records = []
+        if first < last:
+            records.extend(splitter.feed(mm[first:last]))
+            records.extend(splitter.finish())
+        records = [(header, FastaSplitter.join(pieces)) for header, pieces in records]
+    finally:
+        mm.close()
+    if batches:
+        return FastaBatch.fromBytes([header for header, _ in records],
+                                    [sequence for _, sequence in records])
+    records = [(header, FastAreader._encode(sequence, encoding)) for header, sequence in records]
+    if work is not None:
+        return [work(header, sequence) for header, sequence in records]
+    return records
+
+
+class MultiFastAreader:
+    '''
+    Read many FastA files as one stream of records tagged with their source.
+
+    Sources may be file names, glob patterns or a mix of both. Files are
+    parsed concurrently on a thread pool (gzip, BGZF and the bulk parser
+    spend most of their time in C code that releases the GIL), each into
+    a bounded queue, so one consumer can aggregate across hundreds of
+    assemblies in a single interpreter.
+    '''
+
+    # sidecar files of FastaCache (and its temporary copies) and IndexedFastAreader
+    sidecar = re.compile(r'\.(fcache(\.\d+\.tmp)?|fai)$')
+
+    def __init__ (self, sources, workers=None, prefetch=64):
+        '''
+        Constructor for MultiFastAreader.
+
+        Args:
+            sources (str or list): File names and/or glob patterns.
+            workers (int): Optional. Files read at the same time, defaults to
+                the number of CPUs.
+            prefetch (int): Optional. Records queued ahead per file.
+        '''
+        self.fnames = self.expand(sources)
+        self.workers = workers or os.cpu_count() or 1
+        self.prefetch = prefetch
+
+    @staticmethod
+    def expand (sources):
+        '''
+        Args:
+            sources (str or list): File names and/or glob patterns.
+
+        Returns:
+            list: The matching file names, each glob sorted, without repeats.
+                Globs skip the .fcache and .fai sidecars of the readers.
+        '''
+        if isinstance(sources, (str, os.PathLike)):
+            sources = [sources]
+        fnames = []
+        for source in map(os.fspath, sources):
+            if glob.has_magic(source):
+                matches = sorted(fname for fname in glob.glob(source)
+                                 if not MultiFastAreader.sidecar.search(fname))
+            else:
+                matches = [source]
+            if not matches:
+                raise FileNotFoundError(f'no files match {source}')
+            fnames.extend(fname for fname in matches if fname not in fnames)
+        return fnames
+
+    def readFasta (self, ordered=True, **options):
+        '''
+        Read every record of every file.
+
+        Args:
+            ordered (bool): Optional. Yield the files one after the other, in
+                the order given; if False yield records as they are parsed.
+            options: Passed to FastAreader.readFasta for each file; bulk
+                parsing is used unless bulk=False is given.
+
+        Yields:
+            tuple: (file name, header, sequence)
+        '''
+        options.setdefault('bulk', True)
+        done = object()
+        stop = threading.Event()
+
+        def put (out, item):
+            # give up once the consumer has gone, instead of blocking on a full queue
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce (fname, out):
+            try:
+                for header, sequence in FastAreader(fname).readFasta(**options):
+                    if not put(out, (fname, header, sequence)):
+                        return
+            except Exception as error:
+                put(out, error)
+            put(out, done)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                if ordered:
+                    queues = [queue.Queue(maxsize=self.prefetch) for _ in self.fnames]
+                    for fname, out in zip(self.fnames, queues):
+                        pool.submit(produce, fname, out)
+                    for out in queues:
+                        yield from self._drain(out, done, 1)
+                else:
+                    out = queue.Queue(maxsize=self.prefetch * self.workers)
+                    for fname in self.fnames:
+                        pool.submit(produce, fname, out)
+                    yield from self._drain(out, done, len(self.fnames))
+            finally:
+                stop.set()
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _drain (out, done, producers):
+        finished = 0
+        while finished < producers:
+            item = out.get()
+            if item is done:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+
+class FastaSplitter:
+    '''
+    Incremental FastA record splitter shared by the block readers.
+
+    Blocks of any size are fed in; complete records come out as soon as the
+    start of the next record is seen. Only a partial header line or a single
+    trailing newline is carried from one block to the next.
+    '''
+
+    def __init__ (self, select=None):
+        '''
+        Args:
+            select (callable): Optional. Header predicate; the body chunks of
+                rejected records are never copied.
+        '''
+        self.select = select
+        self.header = None
+        self.keep = False
+        self.pieces = []
+        self.inHeader = False
+        self.data = b'\n'          # lets a '>' on the very first line match b'\n>'
+
+    def _setHeader (self, header):
+        self.header = header.decode().rstrip()
+        self.keep = self.select is None or self.select(self.header)
+
+    def feed (self, block, eof=False):
+        '''
+        Args:
+            block (bytes-like): The next piece of the input.
+            eof (bool): Optional. True if no more input follows.
+
+        Yields:
+            tuple: (header, list of raw body chunks) for each record completed
+                by this block.
+        '''
+        data = self.data + block
+        pos = 0
+        while True:
+            if self.inHeader:
+                eol = data.find(b'\n', pos)
+                if eol < 0:
+                    if eof:
+                        self._setHeader(data[pos:])
+                        pos, self.inHeader = len(data), False
+                    break
+                # the newline stays in the body so a '>' on the next line still matches
+                self._setHeader(data[pos:eol])
+                pos, self.inHeader = eol, False
+            mark = data.find(b'\n>', pos)
+            if mark < 0:
+                # keep a trailing newline back, the next block may start with '>'
+                cut = len(data) if eof else max(len(data) - 1, pos)
+                if self.keep and cut > pos:
+                    self.pieces.append(data[pos:cut])
+                pos = cut
+                break
+            if self.keep:
+                self.pieces.append(data[pos:mark])
+                yield self.header, self.pieces
+            self.pieces = []
+            pos, self.inHeader = mark + 2, True
+        self.data = data[pos:]
+
+    def finish (self):
+        '''
+        Yields:
+            tuple: (header, list of raw body chunks) for the last record.
+        '''
+        yield from self.feed(b'', eof=True)
+        if self.keep:
+            yield self.header, self.pieces
+        self.keep = False
+
+    @staticmethod
+    def join (pieces, upper=True):
+        '''
+        Args:
+            pieces (list): Raw body chunks of one record.
+            upper (bool): Optional. Upper case the bases.
+
+        Returns:
+            bytes: The bases without whitespace.
+        '''
+        return b''.join(pieces).translate(FastAreader.upperTable if upper else None, FastAreader.whitespace)
+
+class AsyncFastAreader:
+    '''
+    Read FastA records from an asyncio stream.
+
+        async for header, sequence in AsyncFastAreader(stream):
+            ...
+
+    The stream is read one block at a time, and only when the consumer asks
+    for the next record. An asyncio.StreamReader stops reading from its
+    transport once its buffer reaches its limit, so a slow consumer
+    throttles the producing process instead of the input piling up in
+    memory. With prefetch > 0 a background task parses up to that many
+    records ahead, which overlaps reading with the consumer's computation
+    while keeping the same bound.
+    '''
+
+    def __init__ (self, stream, encoding=None, select=None, prefetch=0, blockSize=1 << 16):
+        '''
+        Constructor for AsyncFastAreader.
+
+        Args:
+            stream (asyncio.StreamReader): Any object with an awaitable read(n).
+            encoding (str): Optional. None, 'uint8' or '2bit', see readFasta.
+            select (callable): Optional. Header predicate, see readFasta.
+            prefetch (int): Optional. Records parsed ahead of the consumer.
+            blockSize (int): Optional. Bytes requested per read.
+        '''
+        if encoding not in (None, 'uint8', '2bit'):
+            raise ValueError(f"unknown sequence encoding '{encoding}'")
+        self.stream = stream
+        self.encoding = encoding
+        self.select = select
+        self.prefetch = prefetch
+        self.blockSize = blockSize
+
+    @classmethod
+    async def fromPipe (cls, pipe, limit=1 << 20, **kwargs):
+        '''
+        Wrap a pipe, such as sys.stdin.buffer or a subprocess stdout, in a
+        StreamReader whose buffer is bounded by limit.
+
+        Args:
+            pipe (file): A readable pipe or socket file object.
+            limit (int): Optional. StreamReader buffer limit in bytes.
+            kwargs: Passed on to the constructor.
+
+        Returns:
+            AsyncFastAreader: A reader over the pipe.
+        '''
+        loop = asyncio.get_running_loop()
+        stream = asyncio.StreamReader(limit=limit, loop=loop)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream, loop=loop), pipe)
+        return cls(stream, **kwargs)
+
+    def __aiter__ (self):
+        if self.prefetch > 0:
+            return self._prefetched()
+        return self._records()
+
+    async def _records (self):
+        splitter = FastaSplitter(self.select)
+        block = await self.stream.read(self.blockSize)
+        while block:
+            for header, pieces in splitter.feed(block):
+                yield header, FastAreader._encode(FastaSplitter.join(pieces), self.encoding)
+            block = await self.stream.read(self.blockSize)
+        for header, pieces in splitter.finish():
+            yield header, FastAreader._encode(FastaSplitter.join(pieces), self.encoding)
+
+    async def _prefetched (self):
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        done = object()
+
+        async def produce ():
+            try:
+                async for record in self._records():
+                    await queue.put(record)
+                await queue.put(done)
+            except Exception as error:
+                await queue.put(error)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                record = await queue.get()
+                if record is done:
+                    break
+                if isinstance(record, Exception):
+                    raise record
+                yield record
+        finally:
+            producer.cancel()
+
+
+class HeaderFilter:
+    '''
+    Header predicate for FastAreader.readFasta(select=...).
+
+    Headers like the UCSC table browser ones in p1860Crisprs.txt,
+
+        pyro1860_1_CRISPRs_crispr1 range=chr:277515-277564 5'pad=0 strand=+
+
+    are split into key=value fields. A record is kept when every test that
+    was given passes: the regular expression is searched in the whole
+    header, strand must equal the strand field, and the range field must
+    be on chrom and overlap [start, end]. Coordinates are 1-based and
+    inclusive, as in the range field itself.
+    '''
+
+    def __init__ (self, pattern=None, strand=None, chrom=None, start=None, end=None):
+        '''
+        Constructor for HeaderFilter.
+
+        Args:
+            pattern (str): Optional. Regular expression searched in the header.
+            strand (str): Optional. '+' or '-'.
+            chrom (str): Optional. Chromosome name of the range field.
+            start (int): Optional. First position of the wanted interval.
+            end (int): Optional. Last position of the wanted interval.
+        '''
+        self.pattern = re.compile(pattern) if pattern is not None else None
+        self.strand = strand
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+
+    @staticmethod
+    def fields (header):
+        '''
+        Args:
+            header (str): A FastA header without the '>'.
+
+        Returns:
+            dict: key=value fields, plus the leading word as 'name'.
+        '''
+        words = header.split()
+        fields = {'name': words[0]} if words else {}
+        for word in words[1:]:
+            key, sep, value = word.partition('=')
+            if sep:
+                fields[key] = value
+        return fields
+
+    @staticmethod
+    def parseRange (value):
+        '''
+        Args:
+            value (str): A range field such as 'chr:277515-277564'.
+
+        Returns:
+            tuple: (chrom, start, end), or None if value is not a range.
+        '''
+        chrom, _, span = value.rpartition(':')
+        first, _, last = span.partition('-')
+        try:
+            return chrom, int(first.replace(',', '')), int(last.replace(',', ''))
+        except ValueError:
+            return None
+
+    def __call__ (self, header):
+        if self.pattern is not None and not self.pattern.search(header):
+            return False
+        if self.strand is None and self.chrom is None and self.start is None and self.end is None:
+            return True
+        fields = self.fields(header)
+        if self.strand is not None and fields.get('strand') != self.strand:
+            return False
+        if self.chrom is None and self.start is None and self.end is None:
+            return True
+        where = self.parseRange(fields.get('range', ''))
+        if where is None:
+            return False
+        chrom, first, last = where
+        if self.chrom is not None and chrom != self.chrom:
+            return False
+        if self.start is not None and last < self.start:
+            return False
+        return self.end is None or first <= self.end
+
+
+class FastaCache:
+    '''
+    Binary cache of the parsed records of one FastA file.
+
+    The cache file (the FastA name plus '.fcache') holds every cleaned
+    sequence back to back, followed by an int64 offsets array, a JSON
+    block with the headers and the source key, and a fixed size trailer.
+    It is written while the first parse streams through and memory mapped
+    on later reads, so a rerun only copies each record out of the map.
+
+    The key is the absolute path, size, mtime and a blake2b fingerprint
+    of the first, middle and last MiB of the file. Hashing every byte
+    would cost as much as parsing, so the fingerprint only samples the file.
+    Any key mismatch makes read return None and the next parse rewrites it.
+    '''
+
+    magic = b'FASTACACHE\x00\x01'
+    trailer = struct.Struct('<QQ12s')   # offsets position, JSON length, magic
+    sample = 1 << 20
+
+    def __init__ (self, fname, cacheName=None):
+        '''
+        Constructor for FastaCache.
+
+        Args:
+            fname (str): The FastA file being cached.
+            cacheName (str): Optional. Cache file, defaults to fname + '.fcache'.
+        '''
+        self.fname = fname
+        self.cacheName = cacheName or fname + '.fcache'
+
+    def key (self):
+        '''
+        Returns:
+            dict: The identity of the current FastA file.
+        '''
+        stat = os.stat(self.fname)
+        fingerprint = hashlib.blake2b(digest_size=16)
+        with open(self.fname, 'rb') as fileH:
+            for start in (0, stat.st_size // 2, stat.st_size - self.sample):
+                fileH.seek(max(start, 0))
+                fingerprint.update(fileH.read(self.sample))
+        return {'path': os.path.abspath(self.fname), 'size': stat.st_size,
+                'mtime': stat.st_mtime_ns, 'fingerprint': fingerprint.hexdigest()}
+
+    def read (self, select=None):
+        '''
+        Open the cache if it matches the current FastA file.
+
+        Args:
+            select (callable): Optional. Header predicate; rejected records
+                are never copied out of the map.
+
+        Returns:
+            generator or None: (header, sequence bytes) records, or None if
+                the cache is missing, damaged or stale.
+        '''
+        try:
+            fileH = open(self.cacheName, 'rb')
+        except OSError:
+            return None
+        with fileH:
+            try:
+                mm = mmap.mmap(fileH.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:          # empty file
+                return None
+        if len(mm) < self.trailer.size:
+            mm.close()
+            return None
+        offsetsPos, jsonLength, magic = self.trailer.unpack(mm[-self.trailer.size:])
+        jsonStart = len(mm) - self.trailer.size - jsonLength
+        if magic != self.magic or not 0 <= offsetsPos <= jsonStart:
+            mm.close()
+            return None
+        try:
+            meta = json.loads(mm[jsonStart:jsonStart + jsonLength])
+            if meta['key'] != self.key():
+                mm.close()
+                return None
+            offsets = np.frombuffer(mm, dtype=np.int64, count=len(meta['headers']) + 1, offset=offsetsPos)
+        except (ValueError, KeyError, TypeError):   # damaged metadata
+            mm.close()
+            return None
+        return self._records(mm, meta['headers'], offsets.tolist(), select)
+
+    @staticmethod
+    def _records (mm, headers, offsets, select):
+        try:
+            for i, header in enumerate(headers):
+                if select is None or select(header):
+                    yield header, mm[offsets[i]:offsets[i + 1]]
+        finally:
+            mm.close()
+
+    def write (self, records):
+        '''
+        Pass records through while saving them to the cache. The cache only
+        replaces the old one once every record has been consumed.
+
+        Args:
+            records (iterable): (header, sequence bytes) pairs.
+
+        Yields:
+            tuple: The same (header, sequence bytes) pairs.
+        '''
+        key = self.key()
+        tempName = f'{self.cacheName}.{os.getpid()}.tmp'
+        try:
+            cacheH = open(tempName, 'wb')
+        except OSError:
+            yield from records          # read only directory: just parse
+            return
+        try:
+            with cacheH:
+                headers = []
+                offsets = [0]
+                for header, sequence in records:
+                    cacheH.write(sequence)
+                    headers.append(header)
+                    offsets.append(offsets[-1] + len(sequence))
+                    yield header, sequence
+                cacheH.write(b'\x00' * (-offsets[-1] % 8))
+                offsetsPos = cacheH.tell()
+                cacheH.write(np.array(offsets, dtype=np.int64).tobytes())
+                meta = json.dumps({'key': key, 'headers': headers}).encode()
+                cacheH.write(meta)
+                cacheH.write(self.trailer.pack(offsetsPos, len(meta), self.magic))
+            os.replace(tempName, self.cacheName)
+        finally:
+            if os.path.exists(tempName):
+                os.remove(tempName)
+
+
+class BgzfReader (io.BufferedIOBase):
+    '''
+    Binary stream over a BGZF (blocked gzip) file.
+
+    BGZF is a series of independent gzip members of at most 64 KiB each,
+    so blocks are handed to a thread pool and inflated in parallel (zlib
+    releases the GIL) while read and readinto serve them back in order.
+    At most a few blocks per thread are held in memory at once.
+    '''
+
+    def __init__ (self, rawH, threads=None):
+        '''
+        Constructor for BgzfReader.
+
+        Args:
+            rawH (file): Binary handle positioned at the first BGZF block.
+            threads (int): Optional. Number of inflating threads, defaults to
+                the number of CPUs.
+        '''
+        self.rawH = rawH
+        threads = threads or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.ahead = 4 * threads
+        self.pending = deque()
+        self.block = b''
+        self.blockPos = 0
+        self.rawDone = False
+
+    @staticmethod
+    def isBgzf (magic):
+        '''
+        Args:
+            magic (bytes): The first 18 bytes of the stream.
+
+        Returns:
+            bool: True if the stream starts with a gzip member carrying the
+                BGZF 'BC' extra field.
+        '''
+        if len(magic) < 18 or magic[:4] != b'\x1f\x8b\x08\x04':
+            return False
+        return magic[12:14] == b'BC' and magic[14:16] == b'\x02\x00'
+
+    def readable (self):
+        return True
+
+    def close (self):
+        if not self.closed:
+            self.pool.shutdown(cancel_futures=True)
+            self.rawH.close()
+        super().close()
+
+    def _readBlock (self):
+        '''
+        Read one compressed block from the raw stream.
+
+        Returns:
+            tuple: (deflate payload, crc32, uncompressed size), or None at
+                the end of the stream.
+        '''
+        head = self.rawH.read(12)
+        if not head:
+            return None
+        if len(head) < 12 or head[:4] != b'\x1f\x8b\x08\x04':
+            raise ValueError('corrupt BGZF block header')
+        xlen = struct.unpack('<H', head[10:12])[0]
+        extra = self.rawH.read(xlen)
+        blockSize = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            slen = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b'BC':
+                blockSize = struct.unpack('<H', extra[pos + 4:pos + 6])[0] + 1
+            pos += 4 + slen
+        if blockSize is None:
+            raise ValueError('gzip member without a BGZF block size')
+        rest = self.rawH.read(blockSize - 12 - xlen)
+        crc, size = struct.unpack('<II', rest[-8:])
+        return rest[:-8], crc, size
+
+    @staticmethod
+    def _inflate (block):
+        payload, crc, size = block
+        data = zlib.decompress(payload, -15)
+        if len(data) != size or zlib.crc32(data) != crc:
+            raise ValueError('BGZF block failed its CRC check')
+        return data
+
+    def _fill (self):
+        '''Keep the thread pool busy with blocks ahead of the reader.'''
+        while not self.rawDone and len(self.pending) < self.ahead:
+            block = self._readBlock()
+            if block is None:
+                self.rawDone = True
+            else:
+                self.pending.append(self.pool.submit(self._inflate, block))
+
+    def _nextBlock (self):
+        '''
+        Returns:
+            bool: False once every block has been consumed.
+        '''
+        while self.blockPos >= len(self.block):
+            self._fill()
+            if not self.pending:
+                return False
+            self.block = self.pending.popleft().result()
+            self.blockPos = 0
+        return True
+
+    def readinto (self, buf):
+        view = memoryview(buf).cast('B')
+        filled = 0
+        while filled < len(view) and self._nextBlock():
+            n = min(len(view) - filled, len(self.block) - self.blockPos)
+            view[filled:filled + n] = self.block[self.blockPos:self.blockPos + n]
+            filled += n
+            self.blockPos += n
+        return filled
+
+    def read (self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            while self._nextBlock():
+                chunks.append(self.block[self.blockPos:])
+                self.blockPos = len(self.block)
+            return b''.join(chunks)
+        buf = bytearray(size)
+        return bytes(buf[:self.readinto(buf)])
+
+    def read1 (self, size=-1):
+        if not self._nextBlock():
+            return b''
+        if size is None or size < 0:
+            size = len(self.block) - self.blockPos
+        data = self.block[self.blockPos:self.blockPos + size]
+        self.blockPos += len(data)
+        return data
+
+
+class IndexedFastAreader (FastAreader):
+    '''
+    Random access to the records of a FastA file by name.
+
+    The file is memory mapped and a samtools style .fai sidecar index
+    (name, length, offset, linebases, linewidth) is written next to it on
+    first use, so later lookups seek straight to the record instead of
+    scanning the file. Records must use a constant line width, the same
+    restriction samtools faidx has.
+
+    Record names are the first whitespace delimited word of the header.
+    '''
+
+    def __init__ (self, fname):
+        '''
+        Constructor for IndexedFastAreader.
+
+        Args:
+            fname (str): The name of the input FastA file. Standard input can
+                not be indexed, so a real file name is required.
+        '''
+        if fname == '':
+            raise ValueError('IndexedFastAreader needs a file name, not stdin')
+        FastAreader.__init__(self, fname)
+        self.indexName = fname + '.fai'
+        self.index = None
+        self.fileH = None
+        self.mm = None
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *exc):
+        self.close()
+
+    def close (self):
+        '''Release the memory map and the underlying file handle.'''
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.fileH is not None:
+            self.fileH.close()
+            self.fileH = None
+
+    def doMap (self):
+        '''
+        Memory map the FastA file, once.
+
+        Returns:
+            mmap.mmap: A read only map of the whole file.
+        '''
+        if self.mm is None:
+            self.fileH = open(self.fname, 'rb')
+            if self.fileH.peek(2)[:2] == b'\x1f\x8b':
+                self.fileH.close()
+                self.fileH = None
+                raise ValueError(f'{self.fname} is compressed and can not be indexed')
+            self.mm = mmap.mmap(self.fileH.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mm
+
+    def loadIndex (self):
+        '''
+        Read the .fai index, building and saving it first if it is missing
+        or older than the FastA file.
+
+        Returns:
+            dict: record name -> (length, offset, linebases, linewidth)
+        '''
+        if self.index is not None:
+            return self.index
+        try:
+            stale = os.path.getmtime(self.indexName) < os.path.getmtime(self.fname)
+        except OSError:
+            stale = True
+        if stale:
+            self.index = self.buildIndex()
+            try:
+                self.writeIndex()
+            except OSError:
+                pass        # read only directory: keep the index in memory only
+        else:
+            self.index = {}
+            with open(self.indexName) as indexH:
+                for line in indexH:
+                    name, length, offset, lineBases, lineWidth = line.rstrip('\n').split('\t')[:5]
+                    self.index[name] = (int(length), int(offset), int(lineBases), int(lineWidth))
+        return self.index
+
+    def writeIndex (self):
+        '''Save the in memory index as a .fai file.'''
+        with open(self.indexName, 'w') as indexH:
+            for name, (length, offset, lineBases, lineWidth) in self.index.items():
+                indexH.write(f'{name}\t{length}\t{offset}\t{lineBases}\t{lineWidth}\n')
+
+    def buildIndex (self):
+        '''
+        Scan the mapped file once and locate every record.
+
+        Returns:
+            dict: record name -> (length, offset, linebases, linewidth)
+        '''
+        mm = self.doMap()
+        index = {}
+        if mm[:1] == b'>':
+            start = 0
+        else:
+            start = mm.find(b'\n>')
+            start = -1 if start < 0 else start + 1
+        while start >= 0:
+            headerEnd = mm.find(b'\n', start)
+            if headerEnd < 0:
+                headerEnd = len(mm)
+            nextStart = mm.find(b'\n>', headerEnd)
+            end = len(mm) if nextStart < 0 else nextStart + 1
+            words = mm[start + 1:headerEnd].split()
+            name = words[0].decode() if words else ''
+            if name in index:
+                raise ValueError(f"duplicate record name '{name}' in {self.fname}")
+            seqStart = min(headerEnd + 1, end)
+            length, lineBases, lineWidth = self._lineLayout(name, mm[seqStart:end])
+            index[name] = (length, seqStart, lineBases, lineWidth)
+            start = -1 if nextStart < 0 else nextStart + 1
+        return index
+
+    @staticmethod
+    def _lineLayout (name, body):
+        '''
+        Check that a record body has a constant line width.
+
+        Args:
+            name (str): Record name, used in the error message.
+            body (bytes): The raw bytes between the header and the next record.
+
+        Returns:
+            tuple: (length, linebases, linewidth)
+        '''
+        content = body.rstrip()
+        if not content:
+            return 0, 0, 0
+        eol = content.find(b'\n')
+        if eol < 0:
+            lineBases = len(content)
+            lineWidth = lineBases + (2 if body[lineBases:lineBases + 2] == b'\r\n' else 1)
+            return lineBases, lineBases, lineWidth
+        lineWidth = eol + 1
+        lineBases = eol - 1 if content[eol - 1:eol] == b'\r' else eol
+        fullLines = content.count(b'\n')
+        lastLine = len(content) - fullLines * lineWidth
+        if (not 0 < lastLine <= lineBases
+                or content[eol::lineWidth] != b'\n' * fullLines
+                or (lineBases < eol and content[eol - 1::lineWidth][:fullLines] != b'\r' * fullLines)):
+            raise ValueError(f"different line length in sequence '{name}'")
+        return fullLines * lineBases + lastLine, lineBases, lineWidth
+
+    def names (self):
+        '''
+        Returns:
+            list: Record names in file order.
+        '''
+        return list(self.loadIndex())
+
+    def __contains__ (self, name):
+        return name in self.loadIndex()
+
+    def __len__ (self):
+        return len(self.loadIndex())
+
+    def __getitem__ (self, name):
+        return self.fetch(name)
+
+    def length (self, name):
+        '''
+        Args:
+            name (str): Record name.
+
+        Returns:
+            int: Number of bases in the record.
+        '''
+        return self.loadIndex()[name][0]
+
+    def fetch (self, name, start=0, end=None):
+        '''
+        Fetch a record or a subrange of it without reading the rest of the file.
+
+        Args:
+            name (str): Record name.
+            start (int): Optional. 0-based first base, inclusive.
+            end (int): Optional. 0-based last base, exclusive. Defaults to the
+                end of the record.
+
+        Returns:
+            str: The upper cased bases, as readFasta would have returned them.
+        '''
+        length, offset, lineBases, lineWidth = self.loadIndex()[name]
+        end = length if end is None else min(end, length)
+        start = max(start, 0)
+        if start >= end:
+            return ''
+        first = offset + (start // lineBases) * lineWidth + start % lineBases
+        last = offset + ((end - 1) // lineBases) * lineWidth + (end - 1) % lineBases + 1
+        return self.doMap()[first:last].translate(None, b'\r\n').decode('ascii').upper()
@@ -0,0 +1,163 @@
+import sys
+import argparse
+import random
+from collections import Counter
+import numpy as np
+from missingMotif import Genome, motif_code, reverse_complement
+
+backends = ['dense', 'hashed', 'singlePass', 'spilled', 'parallel', 'parallelSpilled']
+
+
+class CommandLine:
+    '''
+    Handle the command line, usage and help requests.
+
+    attributes:
+    all arguments received from the commandline using .add_argument will be
+    avalable within the .args attribute of object instantiated from CommandLine.
+    '''
+
+    def __init__(self, inOpts=None):
+        '''
+        Constructor for CommandLine.
+
+        Args:
+            inOpts (list): Optional. List of command-line options and arguments.
+        '''
+        self.parser = argparse.ArgumentParser(
+            description='Check every Genome counting backend against a brute force Counter',
+            add_help=True,
+            prefix_chars='-',
+            usage='%(prog)s [options] -option1[default]'
+        )
+        self.parser.add_argument('-l', '--minK', type=int, default=1, action='store',
+                                 help='min kMer size')
+        self.parser.add_argument('-m', '--maxK', type=int, default=9, action='store',
+                                 help='max kMer size')
+        self.parser.add_argument('-n', '--records', type=int, default=200, action='store',
+                                 help='synthetic records per round')
+        self.parser.add_argument('-r', '--rounds', type=int, default=3, action='store',
+                                 help='rounds, each with its own random records')
+        self.parser.add_argument('--backends', nargs='+', default=backends, choices=backends,
+                                 help='counting backends to check')
+        self.parser.add_argument('--seed', type=int, default=205, action='store',
+                                 help='random seed for the synthetic records')
+
+        if inOpts is None:
+            self.args = self.parser.parse_args()
+        else:
+            self.args = self.parser.parse_args(inOpts)
+
+
+def makeRecords(count, seed):
+    '''
+    Args:
+        count (int): Number of records.
+        seed (int): Random seed.
+
+    Returns:
+        list: Sequences of mixed case with N and IUPAC runs, from empty
+            records to one long enough to be cut into pieces.
+    '''
+    rng = random.Random(seed)
+    lengths = [rng.choice([0, 1, 2, rng.randint(3, 40), rng.randint(40, 600)]) for _ in range(count)]
+    lengths.append(20000)
+    return [''.join(rng.choices('ACGTacgtNR', weights=[24, 24, 24, 24, 2, 2, 2, 2, 3, 1], k=length))
+            for length in lengths]
+
+
+def bruteForce(sequences, k):
+    '''
+    Args:
+        sequences (list): Sequences as text.
+        k (int): k-mer size.
+
+    Returns:
+        dict: canonical code -> count, from the k-mer strings themselves.
+    '''
+    counts = Counter()
+    for sequence in sequences:
+        sequence = sequence.upper()
+        for i in range(len(sequence) - k + 1):
+            kmer = sequence[i:i + k]
+            if not kmer.strip('ACGT'):
+                counts[min(kmer, reverse_complement(kmer))] += 1
+    return {motif_code(kmer): count for kmer, count in counts.items()}
+
+
+def countWith(backend, sequences, minK, maxK):
+    '''
+    Args:
+        backend (str): One of backends.
+        sequences (list): Sequences as text.
+        minK, maxK (int): k range.
+
+    Returns:
+        Genome: The sequences counted with that backend.
+    '''
+    middle = (minK + maxK) // 2
+    if backend == 'dense':
+        genome = Genome(minK, maxK, maxK)
+    elif backend == 'hashed':
+        genome = Genome(minK, maxK, 0)
+    elif backend == 'singlePass':
+        genome = Genome(minK, maxK, maxK, single_pass=True)
+    elif backend in ('spilled', 'parallelSpilled'):
+        # a budget small enough to cut records into pieces and spill many runs
+        genome = Genome(minK, maxK, middle, max_memory=1 << 16)
+    else:
+        genome = Genome(minK, maxK, middle)
+    if backend.startswith('parallel'):
+        genome.count_parallel(iter(sequences), 2, chunk_size=4096)
+    else:
+        genome.count_sequences(sequences)
+    return genome
+
+
+def check(backend, sequences, expected, minK, maxK):
+    '''
+    Args:
+        backend (str): One of backends.
+        sequences (list): Sequences as text.
+        expected (dict): k -> bruteForce counts.
+        minK, maxK (int): k range.
+
+    Returns:
+        list: Messages for every k whose counts differ.
+    '''
+    genome = countWith(backend, sequences, minK, maxK)
+    mismatches = []
+    for k in range(minK, maxK + 1):
+        codes, counts = genome.canonical_table(k)
+        counted = dict(zip(np.asarray(codes).tolist(), np.asarray(counts).tolist()))
+        if counted != expected[k]:
+            wrong = len(set(counted.items()) ^ set(expected[k].items()))
+            mismatches.append(f'{backend} k={k}: {wrong} of {len(expected[k])} counts differ')
+    return mismatches
+
+
+def main(options=None):
+    '''
+    Count random records with every backend, compare each k with a brute
+    force Counter of the canonical k-mer strings and exit 1 on a mismatch.
+
+    Args:
+        options (list): Optional. List of command-line options and arguments.
+    '''
+    cl = CommandLine(options)
+    mismatches = []
+    for trial in range(cl.args.rounds):
+        sequences = makeRecords(cl.args.records, cl.args.seed + trial)
+        expected = {k: bruteForce(sequences, k) for k in range(cl.args.minK, cl.args.maxK + 1)}
+        for backend in cl.args.backends:
+            found = check(backend, sequences, expected, cl.args.minK, cl.args.maxK)
+            print(f"round {trial} {backend:>15} {'ok' if not found else 'MISMATCH'}", file=sys.stderr)
+            mismatches.extend(found)
+    for message in mismatches:
+        print('MISMATCH', message, file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import sys
+import os
+import argparse
+import gzip
+import json
+import random
+import resource
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+from fastaReader import FastAreader
+
+modes = ['line', 'bulk', 'uint8', '2bit', 'batches', 'sharded', 'cacheCold', 'cacheWarm',
+         'stdin', 'gzip', 'bgzf']
+shapes = {
+    # name: (records, line width or 0 for a single line per record)
+    'genome': (4, 60),
+    'longLines': (4, 0),
+    'shortLines': (4, 10),
+    'shortReads': (None, 0),
+}
+
+
+class CommandLine:
+    '''
+    Handle the command line, usage and help requests.
+
+    attributes:
+    all arguments received from the commandline using .add_argument will be
+    avalable within the .args attribute of object instantiated from CommandLine.
+    '''
+
+    def __init__(self, inOpts=None):
+        '''
+        Constructor for CommandLine.
+
+        Args:
+            inOpts (list): Optional. List of command-line options and arguments.
+        '''
+        self.parser = argparse.ArgumentParser(
+            description='Throughput and memory benchmark of the FastAreader modes',
+            add_help=True,
+            prefix_chars='-',
+            usage='%(prog)s [options] -option1[default]'
+        )
+        self.parser.add_argument('-s', '--size', type=float, default=20, action='store',
+                                 help='MB of sequence per synthetic file')
+        self.parser.add_argument('--shapes', nargs='+', default=list(shapes), choices=list(shapes),
+                                 help='file shapes to generate')
+        self.parser.add_argument('--modes', nargs='+', default=modes, choices=modes,
+                                 help='reader modes to time')
+        self.parser.add_argument('-r', '--repeat', type=int, default=3, action='store',
+                                 help='runs per mode, the fastest is kept')
+        self.parser.add_argument('-o', '--output', default='fastaBenchmark.json', action='store',
+                                 help='JSON results file')
+        self.parser.add_argument('-c', '--compare', default=None, action='store',
+                                 help='earlier JSON results to check for regressions')
+        self.parser.add_argument('-t', '--tolerance', type=float, default=0.15, action='store',
+                                 help='allowed fractional slowdown or memory growth before a regression is reported')
+        self.parser.add_argument('--seed', type=int, default=205, action='store',
+                                 help='random seed for the synthetic files')
+        self.parser.add_argument('--worker', nargs=2, metavar=('MODE', 'FILE'), default=None,
+                                 help=argparse.SUPPRESS)
+
+        if inOpts is None:
+            self.args = self.parser.parse_args()
+        else:
+            self.args = self.parser.parse_args(inOpts)
+
+
+def makeFasta(fname, shape, size, seed):
+    '''
+    Write a synthetic FastA file.
+
+    Args:
+        fname (str): Output file name.
+        shape (str): One of the shapes keys.
+        size (float): MB of sequence to write.
+        seed (int): Random seed, so every run times the same bytes.
+    '''
+    rng = random.Random(seed)
+    total = int(size * 1e6)
+    records, width = shapes[shape]
+    # short reads: 150 bp records; otherwise a few long records
+    lengths = [150] * (total // 150) if records is None else [total // records] * records
+    with open(fname, 'w') as fileH:
+        for i, length in enumerate(lengths):
+            sequence = ''.join(rng.choices('ACGTacgtN', weights=[24, 24, 24, 24, 1, 1, 1, 1, 1], k=length))
+            fileH.write(f'>{shape}_{i} length={length}\n')
+            step = width or length or 1
+            fileH.write('\n'.join(sequence[j:j + step] for j in range(0, length, step)))
+            fileH.write('\n')
+
+
+def writeBgzf(source, fname, blockSize=65280):
+    '''
+    Compress a file to BGZF, the blocked gzip layout samtools uses.
+
+    Args:
+        source (str): Input file name.
+        fname (str): Output file name.
+        blockSize (int): Optional. Uncompressed bytes per block.
+    '''
+    with open(source, 'rb') as inH, open(fname, 'wb') as outH:
+        for chunk in iter(lambda: inH.read(blockSize), b''):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = compressor.compress(chunk) + compressor.flush()
+            outH.write(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00')
+            outH.write(struct.pack('<H', len(payload) + 25))
+            outH.write(payload)
+            outH.write(struct.pack('<II', zlib.crc32(chunk), len(chunk)))
+        # the empty end of file block
+        outH.write(bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000'))
+
+
+def consume(mode, fname):
+    '''
+    Read a whole file in one mode.
+
+    Args:
+        mode (str): One of modes.
+        fname (str): Input file name, '' for standard input.
+
+    Returns:
+        int: Number of bases read.
+    '''
+    reader = FastAreader(fname)
+    if mode == 'line':
+        return sum(len(sequence) for _, sequence in reader.readFasta())
+    if mode in ('bulk', 'stdin', 'gzip', 'bgzf'):
+        return sum(len(sequence) for _, sequence in reader.readFasta(bulk=True))
+    if mode in ('uint8', '2bit'):
+        return sum(len(sequence) for _, sequence in reader.readFasta(encoding=mode))
+    if mode == 'batches':
+        return sum(len(batch.data) for batch in reader.readFastaBatches())
+    if mode == 'sharded':
+        return sum(len(sequence) for _, sequence in reader.readFastaSharded(encoding='uint8'))
+    if mode in ('cacheCold', 'cacheWarm'):
+        return sum(len(sequence) for _, sequence in reader.readFasta(cache=True))
+    raise ValueError(f'unknown mode {mode}')
+
+
+def peakMemory():
+    '''
+    Returns:
+        int: Peak resident bytes of this process. Linux keeps ru_maxrss
+            across fork and exec, so a worker would report its parent's
+            peak; VmHWM in /proc/self/status starts afresh with the exec.
+    '''
+    try:
+        with open('/proc/self/status') as statusH:
+            for line in statusH:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024                    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak
+
+
+def runWorker(mode, fname):
+    '''
+    Time one mode in this process and print the result as JSON. Running
+    every mode in a fresh process keeps the peak memory of one mode out of
+    the next one's figure.
+    '''
+    if mode == 'cacheCold' and os.path.exists(fname + '.fcache'):
+        os.remove(fname + '.fcache')
+    start = time.perf_counter()
+    bases = consume(mode, '' if mode == 'stdin' else fname)
+    seconds = time.perf_counter() - start
+    print(json.dumps({'bases': bases, 'seconds': seconds, 'peakBytes': peakMemory()}))
+
+
+def timeMode(mode, fname, repeat):
+    '''
+    Args:
+        mode (str): One of modes.
+        fname (str): Input file, already in the form the mode needs.
+        repeat (int): Runs; the fastest is kept, the largest peak memory.
+
+    Returns:
+        dict: bases, seconds and peakBytes of the mode.
+    '''
+    best = None
+    for _ in range(repeat):
+        with open(fname if mode == 'stdin' else os.devnull, 'rb') as stdin:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode, fname],
+                                 stdin=stdin, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout)
+        if best is not None:
+            result['peakBytes'] = max(result['peakBytes'], best['peakBytes'])
+            if result['seconds'] > best['seconds']:
+                result['seconds'] = best['seconds']
+        best = result
+    return best
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Args:
+        results (list): This run's results.
+        baseline (dict): Results JSON from an earlier run.
+        tolerance (float): Allowed fractional slowdown or growth of the
+            peak memory.
+
+    Returns:
+        list: Messages for every shape and mode that got slower or needs
+            more memory.
+    '''
+    old = {(row['shape'], row['mode']): row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        before = old.get((row['shape'], row['mode']))
+        if before and row['MBps'] < before['MBps'] * (1 - tolerance):
+            regressions.append(f"{row['shape']} {row['mode']}: {before['MBps']:.1f} -> {row['MBps']:.1f} MB/s")
+        if before and before.get('peakBytes') and row['peakBytes'] > before['peakBytes'] * (1 + tolerance):
+            regressions.append(f"{row['shape']} {row['mode']}: {before['peakBytes'] / 2 ** 20:.1f} -> "
+                               f"{row['peakBytes'] / 2 ** 20:.1f} MiB peak")
+    return regressions
+
+
+def main(options=None):
+    '''
+    Generate the synthetic files, time every mode on every shape, write the
+    results and, given an earlier results file, report regressions.
+
+    Args:
+        options (list): Optional. List of command-line options and arguments.
+    '''
+    cl = CommandLine(options)
+    if cl.args.worker:
+        runWorker(*cl.args.worker)
+        return
+    results = []
+    with tempfile.TemporaryDirectory() as workDir:
+        for shape in cl.args.shapes:
+            plain = os.path.join(workDir, shape + '.fa')
+            makeFasta(plain, shape, cl.args.size, cl.args.seed)
+            inputs = {'gzip': plain + '.gz', 'bgzf': plain + '.bgz'}
+            if 'gzip' in cl.args.modes:
+                with open(plain, 'rb') as inH, gzip.open(inputs['gzip'], 'wb') as outH:
+                    outH.write(inH.read())
+            if 'bgzf' in cl.args.modes:
+                writeBgzf(plain, inputs['bgzf'])
+            fileBytes = os.path.getsize(plain)
+            for mode in cl.args.modes:
+                if mode == 'cacheWarm' and not os.path.exists(plain + '.fcache'):
+                    consume('cacheCold', plain)
+                result = timeMode(mode, inputs.get(mode, plain), cl.args.repeat)
+                result.update(shape=shape, mode=mode, fileBytes=fileBytes,
+                              MBps=fileBytes / 1e6 / result['seconds'])
+                results.append(result)
+                print(f"{shape:>10} {mode:>9} {result['MBps']:8.1f} MB/s "
+                      f"{result['peakBytes'] / 2 ** 20:8.1f} MiB peak", file=sys.stderr)
+
+    with open(cl.args.output, 'w') as outH:
+        json.dump({'size': cl.args.size, 'seed': cl.args.seed, 'python': sys.version.split()[0],
+                   'results': results}, outH, indent=1)
+
+    if cl.args.compare:
+        with open(cl.args.compare) as baselineH:
+            regressions = compare(results, json.load(baselineH), cl.args.tolerance)
+        for message in regressions:
+            print('REGRESSION', message, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
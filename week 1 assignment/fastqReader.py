@@ -0,0 +1,150 @@
+import numpy as np
+
+from fastaReader import FastAreader
+
+
+class FastQreader (FastAreader):
+    '''
+    Read FastQ reads from a file or standard input.
+
+    A sibling of FastAreader that uses the same block reads and gzip / BGZF
+    detection. Each block is scanned for newlines with NumPy, and the
+    quality characters of every read in the block are turned into Phred
+    scores by one subtraction. Mean quality filtering is also done for the
+    whole block at once, so rejected reads are dropped before a header or
+    sequence is ever decoded.
+
+    Records are the usual four lines (@header, sequence, +, qualities);
+    wrapped multi-line FastQ is not supported.
+    '''
+
+    def __init__ (self, fname='', phred=33):
+        '''
+        Constructor for FastQreader.
+
+        Args:
+            fname (str): Optional. The name of the input FastQ file.
+            phred (int): Optional. Quality offset, 33 for Sanger/Illumina 1.8+.
+        '''
+        FastAreader.__init__(self, fname)
+        self.phred = phred
+
+    def readFastq (self, trimQuality=None, minMeanQuality=None, minLength=0,
+                   encoding=None, blockSize=None):
+        '''
+        Read FastQ records, optionally trimming and filtering them.
+
+        Args:
+            trimQuality (int): Optional. Trim the 3' end with the BWA rule:
+                cut at the position that maximises the sum of
+                (trimQuality - q) over the removed tail.
+            minMeanQuality (float): Optional. Drop reads whose mean quality,
+                before trimming, is below this.
+            minLength (int): Optional. Drop reads shorter than this after
+                trimming.
+            encoding (str): Optional. None, 'uint8' or '2bit', see
+                FastAreader.readFasta.
+            blockSize (int): Optional. Bytes read per readinto call.
+
+        Yields:
+            tuple: (header, sequence, qualities) where qualities is a uint8
+                array of Phred scores.
+        '''
+        if encoding not in (None, 'uint8', '2bit'):
+            raise ValueError(f"unknown sequence encoding '{encoding}'")
+        buf = bytearray(blockSize or self.blockSize)
+        view = memoryview(buf)
+        data = b''
+        with self.doOpenBinary() as fileH:
+            eof = False
+            while not eof:
+                n = fileH.readinto(buf)
+                eof = not n
+                data += view[:n]
+                if eof and data and not data.endswith(b'\n'):
+                    data += b'\n'
+                used, records = self._parseBlock(data, trimQuality, minMeanQuality, minLength)
+                for header, sequence, qualities in records:
+                    yield header, self._encode(sequence, encoding), qualities
+                data = data[used:]
+        if data.strip():
+            raise ValueError('truncated FastQ record at end of input')
+
+    def _parseBlock (self, data, trimQuality, minMeanQuality, minLength):
+        '''
+        Parse the complete records at the start of data.
+
+        Args:
+            data (bytes): Input starting at a record (or at leading junk).
+            trimQuality, minMeanQuality, minLength: See readFastq.
+
+        Returns:
+            tuple: (bytes consumed, list of (header, sequence bytes, qualities))
+        '''
+        start = data.find(b'@')
+        if start < 0:
+            return len(data) if b'\n' in data else 0, []
+        raw = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(raw[start:] == 10) + start
+        complete = len(newlines) // 4
+        if complete == 0:
+            return start, []
+        ends = newlines[:complete * 4]
+        starts = np.concatenate(([start], ends[:-1] + 1))
+        # drop the \r of Windows line ends
+        ends = ends - (raw[np.maximum(ends - 1, 0)] == 13)
+        starts = starts.reshape(-1, 4)
+        ends = ends.reshape(-1, 4)
+        if (raw[starts[:, 0]] != ord('@')).any() or (raw[starts[:, 2]] != ord('+')).any():
+            raise ValueError('malformed FastQ record, expected @header / sequence / + / qualities')
+        seqLengths = ends[:, 1] - starts[:, 1]
+        if (seqLengths != ends[:, 3] - starts[:, 3]).any():
+            raise ValueError('FastQ sequence and quality lengths differ')
+
+        qualities = raw - np.uint8(self.phred)
+        keep = np.ones(complete, dtype=bool)
+        if minMeanQuality is not None:
+            total = np.concatenate(([0], np.cumsum(qualities, dtype=np.int64)))
+            sums = total[ends[:, 3]] - total[starts[:, 3]]
+            keep &= sums >= minMeanQuality * np.maximum(seqLengths, 1)
+        if trimQuality is None:
+            keep &= seqLengths >= minLength
+
+        records = []
+        upper = data.translate(self.upperTable)
+        for i in np.flatnonzero(keep).tolist():
+            qualStart, qualEnd = int(starts[i, 3]), int(ends[i, 3])
+            length = qualEnd - qualStart
+            if trimQuality is not None:
+                length = self.trimLength(qualities[qualStart:qualEnd], trimQuality)
+                if length < minLength:
+                    continue
+            seqStart = int(starts[i, 1])
+            header = data[starts[i, 0] + 1:ends[i, 0]].decode().rstrip()
+            records.append((header, upper[seqStart:seqStart + length],
+                            qualities[qualStart:qualStart + length]))
+        return int(newlines[complete * 4 - 1]) + 1, records
+
+    @staticmethod
+    def trimLength (qualities, threshold):
+        '''
+        Length left after BWA style 3' quality trimming.
+
+        Args:
+            qualities (np.ndarray): Phred scores of one read.
+            threshold (int): Quality threshold.
+
+        Returns:
+            int: Number of leading bases to keep.
+        '''
+        if len(qualities) == 0:
+            return 0
+        tail = np.cumsum(threshold - qualities[::-1].astype(np.int64))
+        # like BWA, the scan from the 3' end stops where the sum turns negative
+        negative = np.flatnonzero(tail < 0)
+        if len(negative):
+            tail = tail[:negative[0]]
+        if len(tail) == 0:
+            return len(qualities)
+        best = int(np.argmax(tail))
+        return len(qualities) - best - 1 if tail[best] > 0 else len(qualities)
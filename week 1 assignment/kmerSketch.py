@@ -0,0 +1,263 @@
+import sys
+import argparse
+import numpy as np
+from fastaReader import FastAreader, encodeSequence, nCode, splitmix64
+
+
+class CommandLine:
+    '''
+    Handle the command line, usage and help requests.
+
+    attributes:
+    all arguments received from the commandline using .add_argument will be
+    avalable within the .args attribute of object instantiated from CommandLine.
+    '''
+
+    def __init__(self, inOpts=None):
+        '''
+        Constructor for CommandLine.
+
+        Args:
+            inOpts (list): Optional. List of command-line options and arguments.
+        '''
+        self.parser = argparse.ArgumentParser(
+            description='Drop near duplicate FastA records using MinHash sketches',
+            add_help=True,
+            prefix_chars='-',
+            usage='%(prog)s [options] -option1[default] <input >output'
+        )
+        self.parser.add_argument('-k', '--kmer', type=int, default=16, action='store',
+                                 help='kMer size used for sketching')
+        self.parser.add_argument('-n', '--numHashes', type=int, default=128, action='store',
+                                 help='sketch size')
+        self.parser.add_argument('-b', '--bands', type=int, default=32, action='store',
+                                 help='LSH bands')
+        self.parser.add_argument('-t', '--threshold', type=float, default=0.9, action='store',
+                                 help='estimated Jaccard similarity that counts as redundant')
+
+        if inOpts is None:
+            self.args = self.parser.parse_args()
+        else:
+            self.args = self.parser.parse_args(inOpts)
+
+
+class MinHashSketcher:
+    '''
+    MinHash sketches of the canonical k-mers of encoded sequences.
+
+    Each k-mer and its reverse complement are packed two bits per base into
+    one integer, the smaller of the two is hashed with the splitmix64
+    finaliser, and the hashes are reduced to numHashes values by one
+    permutation hashing: hash h goes to bin h % numHashes and each bin keeps
+    its minimum. Empty bins borrow from the next filled bin, so short
+    sequences still get a full signature. All of it is NumPy work over the
+    whole sequence, with no per k-mer Python.
+
+    The fraction of equal bins between two signatures estimates the Jaccard
+    similarity of their k-mer sets.
+    '''
+
+    empty = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+    def __init__(self, k=16, numHashes=128, seed=0):
+        '''
+        Constructor for MinHashSketcher.
+
+        Args:
+            k (int): Optional. k-mer size, at most 32.
+            numHashes (int): Optional. Number of bins in a signature.
+            seed (int): Optional. Hash seed; only signatures made with the
+                same seed, k and numHashes can be compared.
+        '''
+        if not 0 < k <= 32:
+            raise ValueError('k must be between 1 and 32')
+        self.k = k
+        self.numHashes = numHashes
+        self.seed = np.uint64(seed)
+
+    def kmerHashes(self, codes):
+        '''
+        Hash every canonical k-mer that has no N in it.
+
+        Args:
+            codes (np.ndarray): uint8 codes from encodeSequence.
+
+        Returns:
+            np.ndarray: uint64 hashes, one per valid k-mer position.
+        '''
+        k = self.k
+        n = len(codes) - k + 1
+        if n <= 0:
+            return np.empty(0, dtype=np.uint64)
+        bases = codes.astype(np.uint64) & np.uint64(3)
+        forward = np.zeros(n, dtype=np.uint64)
+        reverse = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            forward = (forward << np.uint64(2)) | bases[j:j + n]
+            reverse |= (np.uint64(3) - bases[j:j + n]) << np.uint64(2 * j)
+        isN = np.concatenate(([0], np.cumsum(codes == nCode)))
+        valid = isN[k:] == isN[:-k]
+        return splitmix64(np.minimum(forward, reverse)[valid] ^ self.seed)
+
+    def sketch(self, codes):
+        '''
+        Args:
+            codes (np.ndarray): uint8 codes from encodeSequence.
+
+        Returns:
+            np.ndarray: uint64 signature of numHashes values; all bins are
+                `empty` if the sequence has no valid k-mer.
+        '''
+        signature = np.full(self.numHashes, self.empty, dtype=np.uint64)
+        hashes = self.kmerHashes(codes)
+        if len(hashes) == 0:
+            return signature
+        bins = (hashes % np.uint64(self.numHashes)).astype(np.int64)
+        np.minimum.at(signature, bins, hashes)
+        # densify: an empty bin copies the next filled bin, circularly,
+        # salted by the distance so the copies do not all collide. Filled
+        # bins go through the same mix with distance 0 to stay comparable.
+        filled = np.flatnonzero(signature != self.empty)
+        allBins = np.arange(self.numHashes)
+        source = filled[np.searchsorted(filled, allBins) % len(filled)]
+        distance = ((source - allBins) % self.numHashes).astype(np.uint64)
+        return splitmix64(signature[source] + distance)
+
+    def sketchFasta(self, reader, **options):
+        '''
+        Sketch every record of a FastA file in one streaming pass.
+
+        Args:
+            reader (FastAreader): The input.
+            options: Passed on to reader.readFasta, e.g. select.
+
+        Returns:
+            tuple: (headers list, lengths array, signatures array of shape
+                (records, numHashes))
+        '''
+        options['encoding'] = 'uint8'
+        return self.sketchRecords(reader.readFasta(**options))
+
+    def sketchRecords(self, records):
+        '''
+        Args:
+            records (iterable): (header, codes) pairs.
+
+        Returns:
+            tuple: (headers list, lengths array, signatures array of shape
+                (records, numHashes))
+        '''
+        headers = []
+        lengths = []
+        signatures = []
+        for header, codes in records:
+            headers.append(header)
+            lengths.append(len(codes))
+            signatures.append(self.sketch(codes))
+        signatures = np.array(signatures, dtype=np.uint64).reshape(-1, self.numHashes)
+        return headers, np.array(lengths, dtype=np.int64), signatures
+
+    @classmethod
+    def similarity(cls, first, second):
+        '''
+        Args:
+            first, second (np.ndarray): Signatures from sketch.
+
+        Returns:
+            float: Estimated Jaccard similarity of the two k-mer sets.
+        '''
+        if first[0] == cls.empty or second[0] == cls.empty:
+            return 0.0
+        return float(np.mean(first == second))
+
+
+def lshClusters(signatures, bands=32, threshold=0.9):
+    '''
+    Cluster sketches whose estimated similarity reaches threshold.
+
+    Signatures are cut into bands of rows; records whose band is identical
+    land in one bucket (np.unique over the band columns). Every bucket
+    member is checked against the bucket's first record only, so a bucket
+    of size m costs m comparisons, not m squared, and the whole pass stays
+    near linear. Accepted pairs are joined with union-find.
+
+    Args:
+        signatures (np.ndarray): (records, numHashes) array from sketchFasta.
+        bands (int): Optional. Number of bands; numHashes must divide evenly.
+        threshold (float): Optional. Estimated Jaccard similarity for a merge.
+
+    Returns:
+        np.ndarray: int64 cluster label per record, the index of the
+            cluster's first record.
+    '''
+    records, numHashes = signatures.shape
+    if numHashes % bands:
+        raise ValueError('bands must divide the signature length')
+    rows = numHashes // bands
+    parent = np.arange(records)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    nonEmpty = np.flatnonzero(signatures[:, 0] != MinHashSketcher.empty)
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[nonEmpty, band * rows:(band + 1) * rows])
+        _, first, inverse = np.unique(block, axis=0, return_index=True, return_inverse=True)
+        leaders = nonEmpty[first[inverse.reshape(-1)]]
+        pairs = np.flatnonzero(leaders != nonEmpty)
+        if len(pairs) == 0:
+            continue
+        members = nonEmpty[pairs]
+        similar = np.mean(signatures[members] == signatures[leaders[pairs]], axis=1) >= threshold
+        for member, leader in zip(members[similar].tolist(), leaders[pairs][similar].tolist()):
+            rootMember, rootLeader = find(member), find(leader)
+            if rootMember != rootLeader:
+                parent[max(rootMember, rootLeader)] = min(rootMember, rootLeader)
+    return np.array([find(i) for i in range(records)], dtype=np.int64)
+
+
+def representatives(labels, lengths):
+    '''
+    Args:
+        labels (np.ndarray): Cluster labels from lshClusters.
+        lengths (np.ndarray): Record lengths.
+
+    Returns:
+        np.ndarray: Sorted indices of the longest record of each cluster.
+    '''
+    order = np.lexsort((-lengths, labels))
+    keep = np.concatenate(([True], labels[order][1:] != labels[order][:-1]))
+    return np.sort(order[keep])
+
+
+def main(inFile='', options=None):
+    '''
+    Write one representative of each cluster of near duplicate records.
+
+    Args:
+        inFile (str): Optional. Input FastA file, standard input by default.
+        options (list): Optional. List of command-line options and arguments.
+    '''
+    cl = CommandLine(options)
+    sketcher = MinHashSketcher(cl.args.kmer, cl.args.numHashes)
+    if inFile == '':
+        # standard input can only be read once, so hold on to the records
+        records = list(FastAreader().readFasta(bulk=True))
+        headers, lengths, signatures = sketcher.sketchRecords(
+            (header, encodeSequence(sequence)) for header, sequence in records)
+    else:
+        headers, lengths, signatures = sketcher.sketchFasta(FastAreader(inFile))
+        records = FastAreader(inFile).readFasta(bulk=True)
+    labels = lshClusters(signatures, cl.args.bands, cl.args.threshold)
+    keep = set(representatives(labels, lengths).tolist())
+    for i, (header, sequence) in enumerate(records):
+        if i in keep:
+            sys.stdout.write(f'>{header}\n{sequence}\n')
+    print(f'kept {len(keep)} of {len(headers)} records', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,13 @@
-import sys
 import argparse
-from collections import defaultdict
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import weakref
 import numpy as np
-
-class FastAreader:
-    '''
-    Read FastA sequences from a file or standard input.
-    '''
-
-    def __init__(self, fname=''):
-        '''
-        Constructor for FastAreader.
-
-        Args:
-            fname (str): Optional. The name of the input FastA file.
-        '''
-        self.fname = fname
-        self.fileH = None
-
-    def doOpen(self):
-        '''
-        Open the input file or standard input.
-
-        Returns:
-            file: The file handle for reading.
-        '''
-        if self.fname == '':
-            return sys.stdin
-        else:
-            return open(self.fname)
-
-    def readFasta(self):
-        '''
-        Read FastA sequences from the file.
-
-        Yields:
-            tuple: A tuple containing header and sequence for each sequence in the file.
-        '''
-        header = ''
-        sequence = ''
-        with self.doOpen() as self.fileH:
-            header = ''
-            sequence = ''
-            line = self.fileH.readline()
-            while not line.startswith('>'):
-                line = self.fileH.readline()
-            header = line[1:].rstrip()
-            for line in self.fileH:
-                if line.startswith('>'):
-                    yield header, sequence
-                    header = line[1:].rstrip()
-                    sequence = ''
-                else:
-                    sequence += ''.join(line.rstrip().split()).upper()
-            yield header, sequence
+from fastaReader import FastAreader, MultiFastAreader, encodeSequence, nCode, runIntervals, splitmix64
 
 class CommandLine:
     '''
@@ -92,6 +46,30 @@ class CommandLine:
                                  help='max kMer size')
         self.parser.add_argument('-c', '--cutoff', nargs='?', type=float, default=-4.0, action='store',
                                  help='Zscore cutoff')
+        self.parser.add_argument('-B', '--markov', action='store_true', default=False,
+                                 help='score against the order k-2 Markov background instead of a uniform one')
+        self.parser.add_argument('-P', '--pvalues', nargs='?', default=None, choices=['normal', 'poisson'],
+                                 action='store', help='add two sided P-value and Bonferroni E-value columns')
+        self.parser.add_argument('-d', '--denseMax', nargs='?', type=int, default=12, action='store',
+                                 help='largest kMer size counted in a dense array')
+        self.parser.add_argument('-s', '--singlePass', action='store_true', default=False,
+                                 help='count only maxMotif and derive the smaller kMer counts from it')
+        self.parser.add_argument('-C', '--cache', action='store_true', default=False,
+                                 help='cache the parsed FastA file for later runs')
+        self.parser.add_argument('-M', '--max-memory', dest='maxMemory', nargs='?', type=float, default=None,
+                                 action='store', help='MiB for hashed kMer tables before sorted runs spill to disk')
+        self.parser.add_argument('-S', '--sketch', nargs='?', type=float, default=None, action='store',
+                                 help='MiB of Count-Min sketch for a first approximate pass over the hashed kMers')
+        self.parser.add_argument('--store', nargs='?', default=None, action='store',
+                                 help='count store directory; reopened instead of counting when it exists')
+        self.parser.add_argument('-u', '--update', action='store_true', default=False,
+                                 help='count the input into the existing --store instead of reusing it as is')
+        self.parser.add_argument('--retire', nargs='?', default=None, action='store',
+                                 help='FastA file of records to subtract from the --store')
+        self.parser.add_argument('--mergeStore', nargs='?', default=None, action='store',
+                                 help='another count store to add into the --store')
+        self.parser.add_argument('-w', '--workers', nargs='?', type=int, default=1, action='store',
+                                 help='counting processes, 0 for one per core')
         self.parser.add_argument('-v', '--version', action='version', version='%(prog)s 1.0')
 
         if inOpts is None:
@@ -104,62 +82,1357 @@ class Genome:
     Analyze k-mers in genome sequences.
     '''
 
-    def __init__(self, minK, maxK):
+    # bytes of working arrays per base while one sequence is counted
+    bytes_per_base = 64
+    # spilled runs of one k that are merged into one on disk
+    merge_fan_in = 64
+    # settings file of a count store, see save
+    store_meta = 'genome.json'
+
+    def __init__(self, minK, maxK, denseMaxK=12, single_pass=False, max_memory=None, spill_dir=None,
+                 sketch_memory=None):
         '''
         Constructor for Genome.
 
         Args:
             minK (int): Minimum k-mer size.
             maxK (int): Maximum k-mer size.
+            denseMaxK (int): Optional. Largest k counted in a dense array of
+                all 4**k k-mers (8 bytes each, 128 MiB at k=12); larger k
+                use a hash table of the k-mers actually seen.
+            single_pass (bool): Optional. Count only maxK and derive the
+                smaller k from it, see count_single_pass. Needs maxK to be
+                counted densely.
+            max_memory (int): Optional. Bytes for the hashed tables and the
+                working arrays of the sequence being counted; beyond it
+                sorted runs spill to disk, see spill. Dense arrays are not
+                part of the budget.
+            spill_dir (str): Optional. Directory for spilled runs, a
+                temporary directory removed with the Genome by default.
+            sketch_memory (int): Optional. Bytes of a CountMinSketch that
+                the k above denseMaxK are counted into instead of the
+                hashed tables; recount then counts the candidates exactly.
+
+        The hashed tables hold each k as a short list of runs, sorted
+        (uint64 canonical codes, int64 counts) pairs; new counts become a
+        new run and runs of similar size are merged with merge_tables, so
+        the tables stay NumPy arrays and two Genomes merge by array work.
         '''
+        if maxK > 32:
+            raise ValueError('k-mers longer than 32 do not fit in a 64 bit code')
+        if single_pass and maxK > denseMaxK:
+            raise ValueError('single pass counting needs maxK <= denseMaxK')
+        self.single_pass = single_pass
+        # k -> forward counts of the last k-mer of every ACGT run, single pass only
+        self.tail_counts = {k: np.zeros(4 ** k, dtype=np.int64) for k in range(minK, maxK)} if single_pass else {}
+        self.derived = True
         self.minK = minK
         self.maxK = maxK
-        self.motif_counts = defaultdict(int)
+        self.denseMaxK = denseMaxK
+        # k -> forward strand counts indexed by 2 bit code, folded on demand
+        self.dense_counts = {k: np.zeros(4 ** k, dtype=np.int64)
+                             for k in range(minK, min(maxK, denseMaxK) + 1)}
+        # k -> runs of (sorted canonical 2 bit codes, counts), see add_table
+        self.kmer_counts = {k: [] for k in range(max(minK, denseMaxK + 1), maxK + 1)}
+        # k -> runs spilled to disk, as memory mapped (codes, counts)
+        self.spilled = {k: [] for k in self.kmer_counts}
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.spills = 0
+        self.sketch = CountMinSketch.of_size(sketch_memory) if sketch_memory and self.kmer_counts else None
+        # k -> smallest sketch estimate worth counting exactly, set by recount
+        self.sketch_floor = None
+        # number of sequences counted, as recorded by save and open
+        self.total_seqs = None
 
-    def count_motifs(self, sequence):
+    def count_motifs(self, sequence, limit=None):
         '''
         Count k-mers in a sequence and store their counts.
 
+        Every k-mer is a 2 bit integer code (A=0 C=1 G=2 T=3, first base in
+        the high bits). The codes for k are rolled forward from the codes
+        for k - 1 with one shift and or over the whole sequence, and the
+        reverse complement code is rolled the same way from the other end,
+        so the canonical k-mer is a single integer minimum. k-mers with a
+        base other than ACGT are skipped.
+
+        For k up to denseMaxK the forward codes are simply added to a dense
+        array, see add_codes; the two orientations are folded together
+        only when the counts are read, see canonical_counts.
+
+        Args:
+            sequence (str or np.ndarray): The DNA sequence to analyze, as
+                text or as encodeSequence codes.
+            limit (int): Optional. Count only k-mers starting before this
+                position; used for pieces of a long record that overlap
+                the next piece by maxK - 1 bases, see count_parallel.
+        '''
+        piece_size = self.max_memory // (2 * self.bytes_per_base) if self.max_memory else None
+        if piece_size and limit is None and len(sequence) > piece_size + self.maxK:
+            # keep the working arrays inside the memory budget
+            for piece, piece_limit in split_sequence(sequence, piece_size, self.maxK - 1):
+                self.count_motifs(piece, piece_limit)
+            return
+        if self.single_pass:
+            self.count_single_pass(sequence, limit)
+            return
+        for k, forward, reverse in self.kmer_codes(sequence, limit):
+            if k in self.dense_counts:
+                # dense k are counted exactly in the first pass only
+                if self.sketch_floor is None:
+                    add_codes(self.dense_counts[k], forward.astype(np.int64))
+                continue
+            codes, counts = np.unique(np.minimum(forward, reverse), return_counts=True)
+            if self.sketch is not None:
+                if self.sketch_floor is None:
+                    self.sketch.update(k, codes, counts)
+                    continue
+                candidates = self.sketch.query(k, codes) > self.sketch_floor[k]
+                codes, counts = codes[candidates], counts[candidates]
+            self.add_table(k, codes, counts)
+
+    def recount(self, sequences, total_seqs, cutoff, workers=1):
+        '''
+        Second pass after counting into the sketch: count exactly only the
+        k-mers whose sketch estimate could pass the z-score cutoff.
+
+        A Count-Min estimate is never below the true count, so a k-mer's
+        estimated z-score is never below its true one and every k-mer that
+        passes the cutoff is a candidate. The exact tables then hold the
+        candidates only, and calculate_z_scores drops the false ones.
+
+        Args:
+            sequences (iterable): The sequences of the first pass again.
+            total_seqs (int): Total number of sequences.
+            cutoff (float): Z-score cutoff, as for calculate_z_scores.
+            workers (int): Optional. Processes, see count_parallel.
+        '''
+        self.sketch_floor = {}
+        for k in self.kmer_counts:
+            mean = total_seqs / (4 ** k)
+            std_dev = (mean * (1 - (1 / (4 ** k))) ** 0.5)
+            # one count of slack against rounding at the boundary
+            self.sketch_floor[k] = mean + cutoff * std_dev - 1
+        if workers != 1:
+            self.count_parallel(sequences, workers)
+            return
+        for sequence in sequences:
+            self.count_motifs(sequence)
+
+    def empty_copy(self, max_memory=None):
+        '''
+        Args:
+            max_memory (int): Optional. Memory budget of the copy; its runs
+                spill to a new directory inside this Genome's spill
+                directory, which is removed with this Genome.
+
+        Returns:
+            Genome: Same k range and backends with nothing counted, for
+                count_parallel workers. In a second sketch pass the copy
+                reads the same sketch and candidate floors.
+        '''
+        spill_dir = tempfile.mkdtemp(prefix='copy', dir=self.spill_directory()) if max_memory else None
+        copy = Genome(self.minK, self.maxK, self.denseMaxK, self.single_pass, max_memory, spill_dir)
+        if self.sketch is not None:
+            copy.sketch = self.sketch if self.sketch_floor is not None else self.sketch.empty_copy()
+            copy.sketch_floor = self.sketch_floor
+        return copy
+
+    def add_table(self, k, codes, counts):
+        '''
+        Add counts to the hashed table of k.
+
+        The counts become a new run; while the run before it is at most
+        twice its size the two are merged, so a table of N codes is a
+        handful of runs of falling size and every code is merged about
+        log N times.
+
+        Args:
+            k (int): A k above denseMaxK.
+            codes (np.ndarray): Sorted unique uint64 canonical codes.
+            counts (np.ndarray): Their counts.
+        '''
+        runs = self.kmer_counts[k]
+        runs.append((np.asarray(codes, dtype=np.uint64), np.asarray(counts, dtype=np.int64)))
+        while len(runs) > 1 and len(runs[-2][0]) <= 2 * len(runs[-1][0]):
+            runs[-2:] = [merge_tables(runs[-2:])]
+        if self.max_memory and self.table_bytes() > self.max_memory // 2:
+            self.spill()
+
+    def table_bytes(self):
+        '''
+        Returns:
+            int: Bytes held by the in-memory runs of all hashed tables.
+        '''
+        return sum(codes.nbytes + counts.nbytes for runs in self.kmer_counts.values() for codes, counts in runs)
+
+    def spill_directory(self):
+        '''
+        Returns:
+            str: The directory for spilled runs, a temporary one removed
+                with the Genome unless spill_dir was given.
+        '''
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='kmers')
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        return self.spill_dir
+
+    def __getstate__(self):
+        '''
+        Pickle spilled runs as their file names, so a Genome sent back by a
+        count_parallel worker does not copy its tables through the queue.
+        '''
+        state = self.__dict__.copy()
+        state['spilled'] = {k: [(codes.filename[:-len('.codes')], len(codes)) if isinstance(codes, np.memmap)
+                                else (codes, counts) for codes, counts in runs]
+                            for k, runs in self.spilled.items()}
+        return state
+
+    def __setstate__(self, state):
+        '''
+        Map the spilled runs of a pickled Genome back in, see __getstate__.
+        '''
+        state['spilled'] = {k: [open_run(*run) if isinstance(run[0], str) else run for run in runs]
+                            for k, runs in state['spilled'].items()}
+        self.__dict__.update(state)
+
+    def spill(self, ks=None):
+        '''
+        Write the in-memory runs to disk, one sorted run per k.
+
+        Args:
+            ks (iterable): Optional. The k to spill, every hashed k by default.
+        '''
+        self.spill_directory()
+        for k in self.kmer_counts if ks is None else ks:
+            runs = self.kmer_counts[k]
+            if not runs:
+                continue
+            self.spills += 1
+            fname = os.path.join(self.spill_dir, f'k{k}_{self.spills}')
+            self.spilled[k].append(write_run(fname, *merge_tables(runs)))
+            runs.clear()
+            if len(self.spilled[k]) >= self.merge_fan_in:
+                self.merge_spilled(k)
+
+    def merge_spilled(self, k):
+        '''
+        Replace the spilled runs of k by their k-way merge, see merge_runs.
+        '''
+        self.spills += 1
+        fname = os.path.join(self.spill_dir, f'k{k}_{self.spills}')
+        merged = merge_runs(self.spilled[k], fname, self.max_memory)
+        for codes, counts in self.spilled[k]:
+            remove_run(codes, counts)
+        self.spilled[k] = [merged]
+
+    def sparse_table(self, k):
+        '''
+        Args:
+            k (int): A k above denseMaxK.
+
+        Returns:
+            tuple: (sorted uint64 canonical codes, int64 counts), all runs
+                of k merged into one; memory maps once the table spilled.
+        '''
+        if self.spilled[k]:
+            if self.kmer_counts[k] or len(self.spilled[k]) > 1:
+                self.spill([k])
+                self.merge_spilled(k)
+            return self.spilled[k][0]
+        runs = self.kmer_counts[k]
+        if len(runs) != 1:
+            runs[:] = [merge_tables(runs)]
+        return runs[0]
+
+    def merge(self, other, sign=1):
+        '''
+        Add the counts of another Genome into this one, or take them away.
+
+        Dense arrays are added in place; the hashed tables of other become
+        runs of this Genome, so two stores merge by sorted array merges.
+
+        Args:
+            other (Genome): Counted with the same minK, maxK, denseMaxK and
+                single_pass, e.g. another store from open.
+            sign (int): Optional. -1 to subtract, e.g. retired records
+                counted into an empty_copy.
+        '''
+        if ((other.minK, other.maxK, other.denseMaxK, other.single_pass)
+                != (self.minK, self.maxK, self.denseMaxK, self.single_pass)):
+            raise ValueError('only Genomes with the same k range and backends can be merged')
+        for k, counts in other.dense_counts.items():
+            self.dense_counts[k] += sign * counts
+        for k, counts in other.tail_counts.items():
+            self.tail_counts[k] += sign * counts
+        for k, runs in other.kmer_counts.items():
+            for codes, counts in runs:
+                self.add_table(k, codes, sign * np.asarray(counts))
+            for codes, counts in other.spilled[k]:
+                if self.max_memory and sign > 0 and isinstance(codes, np.memmap):
+                    # take the run over as it is on disk
+                    self.spilled[k].append((codes, counts))
+                    if len(self.spilled[k]) >= self.merge_fan_in:
+                        self.merge_spilled(k)
+                    continue
+                # a slice of a sorted run is a sorted run, so large ones go in by blocks
+                block = max(1 << 12, self.max_memory // 64) if self.max_memory else max(len(codes), 1)
+                for start in range(0, len(codes), block):
+                    self.add_table(k, codes[start:start + block], sign * np.asarray(counts[start:start + block]))
+        if self.sketch is not None and self.sketch_floor is None:
+            self.sketch.merge(other.sketch)
+        if self.total_seqs is not None and other.total_seqs is not None:
+            self.total_seqs += sign * other.total_seqs
+        # derived k are rebuilt from the summed maxK and tail counts
+        self.derived = self.derived and other.derived
+        if sign < 0:
+            self.derive_counts()
+            negative = [k for k, counts in self.dense_counts.items() if counts.min() < 0]
+            negative += [k for k in self.kmer_counts if (self.sparse_table(k)[1] < 0).any()]
+            if negative:
+                raise ValueError(f'subtracted counts were never added, k = {negative}')
+
+    def count_sequences(self, sequences, workers=1):
+        '''
+        Count sequences one after another or, given workers, on a pool.
+
+        Args:
+            sequences (iterable): Sequences as text or encodeSequence codes.
+            workers (int): Optional. Processes, see count_parallel; 1
+                counts in this process.
+
+        Returns:
+            int: Number of sequences counted.
+        '''
+        if workers != 1:
+            return self.count_parallel(sequences, workers)
+        total_seqs = 0
+        for sequence in sequences:
+            total_seqs += 1
+            self.count_motifs(sequence)
+        return total_seqs
+
+    def subtract(self, sequences):
+        '''
+        Take the k-mers of retired sequences back out of the counts.
+
+        Args:
+            sequences (iterable): The retired sequences, exactly as counted.
+
+        Returns:
+            int: Number of sequences subtracted.
+        '''
+        if self.max_memory:
+            # leave the whole budget to the retired counts
+            self.spill()
+        retired = self.empty_copy(self.max_memory)
+        total_seqs = retired.count_sequences(sequences)
+        self.merge(retired, -1)
+        if self.total_seqs is not None:
+            self.total_seqs -= total_seqs
+        return total_seqs
+
+    def count_parallel(self, sequences, workers=None, chunk_size=1 << 22):
+        '''
+        Count sequences on a pool of processes.
+
+        The sequences are cut into tasks of about chunk_size bases: short
+        records are grouped, long records are split into pieces that
+        overlap the next piece by maxK - 1 bases and count only the k-mers
+        starting before the overlap, so every k-mer is counted exactly
+        once. Each worker counts its tasks into a Genome of its own and
+        sends it back once at the end; those are added up with merge.
+
+        Args:
+            sequences (iterable): Sequences as text or encodeSequence codes.
+            workers (int): Optional. Number of processes, one per core by
+                default.
+            chunk_size (int): Optional. Bases per task.
+
+        Returns:
+            int: Number of sequences counted.
+        '''
+        if workers is not None and workers < 0:
+            raise ValueError('the number of workers cannot be negative')
+        workers = workers or os.cpu_count() or 1
+        # each worker spills to its own directory within an even share of the budget
+        template = self.empty_copy(self.max_memory // workers if self.max_memory else None)
+        tasks = multiprocessing.Queue(2 * workers)
+        results = multiprocessing.Queue()
+        pool = [multiprocessing.Process(target=count_worker, args=(template, tasks, results), daemon=True)
+                for _ in range(workers)]
+        for process in pool:
+            process.start()
+        total_seqs = 0
+        try:
+            task, size = [], 0
+            for sequence in sequences:
+                total_seqs += 1
+                for piece, limit in split_sequence(sequence, chunk_size, self.maxK - 1):
+                    task.append((piece, limit))
+                    size += len(piece)
+                    if size >= chunk_size:
+                        tasks.put(task)
+                        task, size = [], 0
+            if task:
+                tasks.put(task)
+        finally:
+            for _ in pool:
+                tasks.put(None)
+        errors = []
+        for _ in pool:
+            genome = results.get()
+            if isinstance(genome, Exception):
+                errors.append(genome)
+            else:
+                self.merge(genome)
+        for process in pool:
+            process.join()
+        if errors:
+            raise errors[0]
+        return total_seqs
+
+    def save(self, path, total_seqs):
+        '''
+        Write the count tables to a store directory that open maps back in.
+
+        Each table is one .npy file: the forward counts of every dense k
+        (dense_k), the run end counts of single pass counting (tail_k) and
+        the sorted codes and counts of every hashed k (codes_k, counts_k).
+        The settings go to genome.json. Files are written under a temporary
+        name and renamed into place, so a store can be saved over the one
+        it was opened from.
+
+        Args:
+            path (str): Store directory, created if needed.
+            total_seqs (int): Number of sequences counted.
+        '''
+        if self.sketch is not None:
+            raise ValueError('sketch counts hold only the candidates of one cutoff; save an exact count')
+        self.derive_counts()
+        os.makedirs(path, exist_ok=True)
+        tables = {f'dense_{k}': counts for k, counts in self.dense_counts.items()}
+        tables.update((f'tail_{k}', counts) for k, counts in self.tail_counts.items())
+        for k in self.kmer_counts:
+            tables[f'codes_{k}'], tables[f'counts_{k}'] = self.sparse_table(k)
+        for name, table in tables.items():
+            fname = os.path.join(path, name + '.npy')
+            with open(fname + '.tmp', 'wb') as fileH:
+                np.save(fileH, table)
+            os.replace(fname + '.tmp', fname)
+        settings = {'minK': self.minK, 'maxK': self.maxK, 'denseMaxK': self.denseMaxK,
+                    'single_pass': self.single_pass, 'total_seqs': total_seqs}
+        fname = os.path.join(path, self.store_meta)
+        with open(fname + '.tmp', 'w') as fileH:
+            json.dump(settings, fileH, indent=1)
+        os.replace(fname + '.tmp', fname)
+        self.total_seqs = total_seqs
+
+    @classmethod
+    def store_settings(cls, path):
+        '''
+        Args:
+            path (str): Store directory.
+
+        Returns:
+            dict: The settings save wrote to genome.json.
+        '''
+        with open(os.path.join(path, cls.store_meta)) as fileH:
+            return json.load(fileH)
+
+    @classmethod
+    def open(cls, path, minK=None, maxK=None):
+        '''
+        Map a store written by save back into a Genome.
+
+        The tables are memory mapped, so opening costs a few file opens
+        whatever the store's size, and only the pages that are read are
+        loaded. Dense arrays are mapped copy on write, so more sequences
+        can be counted into the Genome without touching the store.
+
+        Args:
+            path (str): Store directory.
+            minK, maxK (int): Optional. Open only this part of the store's
+                k range.
+
+        Returns:
+            Genome: The counts, with total_seqs set.
+        '''
+        settings = cls.store_settings(path)
+        minK = settings['minK'] if minK is None else minK
+        maxK = settings['maxK'] if maxK is None else maxK
+        if minK < settings['minK'] or maxK > settings['maxK'] or minK > maxK:
+            raise ValueError(f"store {path} holds k {settings['minK']} to {settings['maxK']}")
+        # a narrower single pass store cannot derive its smaller k again, so open it as counted per k
+        single_pass = settings['single_pass'] and maxK == settings['maxK']
+        genome = cls(minK, maxK, settings['denseMaxK'], single_pass)
+
+        def load(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='c')
+
+        genome.dense_counts = {k: load(f'dense_{k}') for k in genome.dense_counts}
+        genome.tail_counts = {k: load(f'tail_{k}') for k in range(minK, maxK)} if single_pass else {}
+        genome.kmer_counts = {k: [(load(f'codes_{k}'), load(f'counts_{k}'))] for k in genome.kmer_counts}
+        genome.total_seqs = settings['total_seqs']
+        return genome
+
+    def count_single_pass(self, sequence, limit=None):
+        '''
+        Count only the maxK-mers of a sequence and remember run ends, so the
+        counts for every smaller k can be derived without another pass.
+
+        A (k+1)-mer count array summed over its last base gives the count of
+        every k-mer that is followed by another base. The only k-mers it
+        misses are the last one of each run of ACGT bases (at the end of the
+        record or before an N), and those are counted here, once per run.
+        derive_counts then builds maxK - 1 down to minK from maxK.
+
         Args:
-            sequence (str): The DNA sequence to analyze.
+            sequence (str or np.ndarray): Text or encodeSequence codes.
+            limit (int): Optional. See count_motifs.
+        '''
+        bases = encodeSequence(sequence) if isinstance(sequence, (str, bytes)) else sequence
+        maxK = self.maxK
+        n = len(bases)
+        limit = n if limit is None else limit
+        bits = (bases & 3).astype(np.int64)
+        if n >= maxK:
+            forward = np.zeros(n - maxK + 1, dtype=np.int64)
+            for i in range(maxK):
+                forward = (forward << 2) | bits[i:n - maxK + 1 + i]
+            isN = np.concatenate(([0], np.cumsum(bases == nCode)))
+            valid = isN[maxK:] == isN[:-maxK]
+            valid[limit:] = False
+            add_codes(self.dense_counts[maxK], forward[valid])
+        runs = runIntervals(bases != nCode)
+        ends = runs[:, 1]
+        lengths = ends - runs[:, 0]
+        tail = np.zeros(len(runs), dtype=np.int64)
+        for k in range(1, maxK):
+            long_enough = lengths >= k
+            tail[long_enough] |= bits[ends[long_enough] - k] << (2 * (k - 1))
+            if k >= self.minK:
+                counted = long_enough & (ends - k < limit)
+                add_codes(self.tail_counts[k], tail[counted])
+        self.derived = False
+
+    def derive_counts(self):
+        '''
+        Rebuild the forward counts for minK .. maxK - 1 from the maxK counts
+        after single pass counting; a no-op when they are up to date.
+        '''
+        if self.derived:
+            return
+        for k in range(self.maxK - 1, self.minK - 1, -1):
+            self.dense_counts[k] = self.dense_counts[k + 1].reshape(-1, 4).sum(axis=1) + self.tail_counts[k]
+        self.derived = True
+
+    def kmer_codes(self, sequence, limit=None):
+        '''
+        Yield the codes of every valid k-mer for each k.
+
+        Args:
+            sequence (str or np.ndarray): Text or encodeSequence codes.
+            limit (int): Optional. See count_motifs.
+
+        Yields:
+            tuple: (k, uint64 forward codes, uint64 reverse complement codes)
+        '''
+        bases = encodeSequence(sequence) if isinstance(sequence, (str, bytes)) else sequence
+        n = len(bases)
+        limit = n if limit is None else limit
+        if n < self.minK:
+            return
+        isN = np.concatenate(([0], np.cumsum(bases == nCode)))
+        bases = (bases & 3).astype(np.uint64)
+        forward = np.zeros(n, dtype=np.uint64)
+        reverse = np.zeros(n, dtype=np.uint64)
+        for k in range(1, min(self.maxK, n) + 1):
+            # forward[i] and reverse[i] now describe the k-mer starting at i
+            forward = (forward[:n - k + 1] << np.uint64(2)) | bases[k - 1:]
+            reverse = reverse[:n - k + 1] | ((np.uint64(3) - bases[k - 1:]) << np.uint64(2 * (k - 1)))
+            if k >= self.minK:
+                valid = isN[k:] == isN[:-k]
+                valid[limit:] = False
+                yield k, forward[valid], reverse[valid]
+
+    def canonical_counts(self, k):
         '''
+        Fold a dense forward strand count array onto canonical k-mers.
+
+        Args:
+            k (int): A k counted densely.
+
+        Returns:
+            np.ndarray: int64 counts indexed by code; a canonical code (the
+                smaller of a k-mer and its reverse complement) holds the
+                count of both, every other code holds 0.
+        '''
+        self.derive_counts()
+        return fold_strands(self.dense_counts[k], k)
+
+    def markov_expectation(self, k):
+        '''
+        Expected forward counts of every k-mer under the order k-2 Markov
+        model fitted to the sequences themselves.
+
+        A k-mer is a first base a, a middle m of k - 2 bases and a last base
+        b, and E = c(am) c(mb) / c(m). With the (k-1)-mer counts reshaped to
+        (4, 4**(k-2)) for c(am) and to (4**(k-2), 4) for c(mb), every E comes
+        from one broadcast product over a (4, 4**(k-2), 4) array. The
+        variance is the usual approximation for this model, ignoring the
+        k-mer's overlaps with itself:
+        E (c(m) - c(am)) (c(m) - c(mb)) / c(m)**2.
+
+        Args:
+            k (int): At least 2, with k - 1 and k - 2 (if above 0) counted
+                densely.
+
+        Returns:
+            tuple: (expected, variance) float64 arrays indexed by forward code.
+        '''
+        if (k < 2 or k not in self.dense_counts or k - 1 not in self.dense_counts
+                or (k > 2 and k - 2 not in self.dense_counts)):
+            raise ValueError(f'the Markov background of k = {k} needs dense counts of k - 2 to k')
+        self.derive_counts()
+        sub = self.dense_counts[k - 1].astype(np.float64)
+        middle = self.dense_counts[k - 2].astype(np.float64) if k > 2 else np.array([sub.sum()])
+        inner = 4 ** (k - 2)
+        prefix = sub.reshape(4, inner)[:, :, None]
+        suffix = sub.reshape(inner, 4)[None, :, :]
+        middle = middle.reshape(1, inner, 1)
+        safe = np.where(middle > 0, middle, 1.0)
+        expected = np.where(middle > 0, prefix * suffix / safe, 0.0)
+        variance = expected * (middle - prefix) * (middle - suffix) / safe ** 2
+        return expected.reshape(-1), variance.reshape(-1)
+
+    def score_chunks(self, k, total_seqs, markov=False):
+        '''
+        Score every canonical k-mer of k.
+
+        The uniform background expects total_seqs / 4**k of each k-mer,
+        with the standard deviation calculate_z_scores has always used. The
+        Markov background (see markov_expectation) folds the expectation
+        and variance of both orientations together like the counts, and
+        also scores k-mers that were expected but never seen.
+
+        Args:
+            k (int): A counted k; dense for the Markov background.
+            total_seqs (int): Total number of sequences.
+            markov (bool): Optional. Use the Markov background.
+
+        Yields:
+            tuple: (uint64 codes, int64 counts, float64 expected, float64
+                z-scores) in code order, a chunk at a time.
+        '''
+        if not markov:
+            mean = total_seqs / (4 ** k)
+            std_dev = (mean * (1 - (1 / (4 ** k))) ** 0.5)
+            for codes, counts in self.table_chunks(k):
+                yield codes, counts, np.full(len(codes), mean), (counts - mean) / std_dev
+            return
+        expected, variance = (fold_strands(values, k) for values in self.markov_expectation(k))
+        counts = self.canonical_counts(k)
+        codes = np.flatnonzero((counts > 0) | (expected > 0))
+        counts, expected, variance = counts[codes], expected[codes], variance[codes]
+        deviation = counts - expected
+        # a zero variance scores an exact expectation 0 and anything else as infinite
+        scores = np.where(deviation > 0, np.inf, -np.inf)
+        scores[deviation == 0] = 0.0
+        np.divide(deviation, np.sqrt(variance), out=scores, where=variance > 0)
+        yield codes.astype(np.uint64), counts, expected, scores
+
+    def passing_scores(self, k, total_seqs, cutoff, markov=False):
+        '''
+        Args:
+            k, total_seqs, markov: See score_chunks.
+            cutoff (float): Z-score cutoff.
+
+        Returns:
+            tuple: (codes, counts, expected, z-scores) of the k-mers whose
+                z-score is above cutoff, by increasing z-score and then code.
+        '''
+        parts = []
+        for codes, counts, expected, scores in self.score_chunks(k, total_seqs, markov):
+            passed = scores > cutoff
+            parts.append((codes[passed], counts[passed], expected[passed], scores[passed]))
+        if not parts:
+            return (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64),
+                    np.empty(0), np.empty(0))
+        codes, counts, expected, scores = (np.concatenate(columns) for columns in zip(*parts))
+        order = np.argsort(scores, kind='stable')
+        return codes[order], counts[order], expected[order], scores[order]
+
+    def canonical_table(self, k):
+        '''
+        Args:
+            k (int): A counted k.
+
+        Returns:
+            tuple: (uint64 canonical codes, int64 counts) of every k-mer seen
+                at least once, in code order.
+        '''
+        if k in self.dense_counts:
+            folded = self.canonical_counts(k)
+            codes = np.flatnonzero(folded)
+            return codes.astype(np.uint64), folded[codes]
+        return self.sparse_table(k)
+
+    def table_chunks(self, k, chunk_size=1 << 22):
+        '''
+        Args:
+            k (int): A counted k.
+            chunk_size (int): Optional. Codes per chunk.
+
+        Yields:
+            tuple: canonical_table(k) in slices of chunk_size codes, so a
+                spilled table is read a piece at a time.
+        '''
+        codes, counts = self.canonical_table(k)
+        for start in range(0, len(codes), chunk_size):
+            yield np.asarray(codes[start:start + chunk_size]), np.asarray(counts[start:start + chunk_size])
+
+    def count_of(self, motif):
+        '''
+        Args:
+            motif (str): A k-mer in either orientation.
+
+        Returns:
+            int: How often the motif or its reverse complement was seen.
+        '''
+        k = len(motif)
+        code = motif_code(motif)
+        partner = motif_code(reverse_complement(motif))
+        if k in self.dense_counts:
+            self.derive_counts()
+            forward = self.dense_counts[k]
+            return int(forward[code] + (forward[partner] if partner != code else 0))
+        codes, counts = self.sparse_table(k)
+        i = np.searchsorted(codes, np.uint64(min(code, partner)))
+        return int(counts[i]) if i < len(codes) and codes[i] == min(code, partner) else 0
+
+    @property
+    def motif_counts(self):
+        '''
+        dict: canonical motif string -> count over every k. Built on demand
+        for callers that want strings; the counting itself uses codes.
+        '''
+        motif_counts = {}
         for k in range(self.minK, self.maxK + 1):
-            for i in range(len(sequence) - k + 1):
-                motif = sequence[i:i + k]
-                canonical_motif = min(motif, reverse_complement(motif))
-                self.motif_counts[canonical_motif] += 1
+            for codes, counts in self.table_chunks(k):
+                motif_counts.update(zip((code_motif(code, k) for code in codes.tolist()), counts.tolist()))
+        return motif_counts
 
-    def calculate_z_scores(self, total_seqs, cutoff):
+    def calculate_z_scores(self, total_seqs, cutoff, markov=False):
         '''
         Calculate Z-scores for motifs.
 
         Args:
             total_seqs (int): Total number of sequences.
             cutoff (float): Z-score cutoff.
+            markov (bool): Optional. Score against the Markov background,
+                see score_chunks; only k from minK + 2 (or 2 when minK is
+                1) have one, and they must be dense.
 
         Returns:
             dict: A dictionary of motifs and their Z-scores.
         '''
         z_scores = {}
-        for motif, count in self.motif_counts.items():
-            mean = total_seqs / (4 ** len(motif))
-            std_dev = (mean * (1 - (1 / (4 ** len(motif)))) ** 0.5)
-            z_score = (count - mean) / std_dev
-            if z_score > cutoff:
-                z_scores[motif] = z_score
+        first = (2 if self.minK == 1 else self.minK + 2) if markov else self.minK
+        for k in range(first, self.maxK + 1):
+            codes, _, _, scores = self.passing_scores(k, total_seqs, cutoff, markov)
+            z_scores.update(zip(code_motifs(codes, k), scores.tolist()))
         return z_scores
 
-    def Evalue(self, s):
+    def significance(self, k, total_seqs, markov=False, poisson=False):
+        '''
+        Two sided P-values and Bonferroni E-values of every k-mer of k.
+
+        Args:
+            k, total_seqs, markov: See score_chunks.
+            poisson (bool): Optional. Exact Poisson tails of the count
+                around its expectation instead of the normal approximation
+                of the z-score.
+
+        Yields:
+            tuple: (codes, counts, expected, z-scores, natural log P-values,
+                natural log E-values) arrays, a chunk at a time. Logs keep
+                P-values far below the smallest float apart.
+        '''
+        for codes, counts, expected, scores in self.score_chunks(k, total_seqs, markov):
+            log_p = log_p_values(counts, expected, scores, poisson)
+            yield codes, counts, expected, scores, log_p, log_e_values(log_p, k)
+
+    def pValue(self, s, total_seqs, markov=False, poisson=False):
+        '''
+        Calculate the two sided P-value of one motif; use significance for
+        whole tables.
+
+        Args:
+            s (str): The motif sequence.
+            total_seqs, markov, poisson: See significance.
+
+        Returns:
+            float: The P-value for the motif; 1.0 for a motif the Markov
+                background did not score.
+        '''
+        k = len(s)
+        code = min(motif_code(s), motif_code(reverse_complement(s)))
+        for codes, _, _, _, log_p, _ in self.significance(k, total_seqs, markov, poisson):
+            i = np.searchsorted(codes, np.uint64(code))
+            if i < len(codes) and codes[i] == code:
+                return float(np.exp(log_p[i]))
+        if markov:
+            # a Markov background expects nothing of a motif it did not score
+            return 1.0
+        # never seen, and not scored: the uniform background's zero count
+        count, expected = np.zeros(1, dtype=np.int64), np.full(1, total_seqs / (4 ** k))
+        std_dev = (expected * (1 - (1 / (4 ** k))) ** 0.5)
+        return float(np.exp(log_p_values(count, expected, (count - expected) / std_dev, poisson)[0]))
+
+    def Evalue(self, s, total_seqs, markov=False, poisson=False):
         '''
         Calculate E-value for a motif.
 
         Args:
             s (str): The motif sequence.
+            total_seqs, markov, poisson: See significance.
+
+        Returns:
+            float: The E-value for the motif, its P-value times the number
+                of canonical motifs of its length.
+        '''
+        return self.pValue(s, total_seqs, markov, poisson) * canonical_kmers(len(s))
 
+def canonical_kmers(k):
+    '''
+    Args:
+        k (int): The k-mer length.
+
+    Returns:
+        int: Number of canonical k-mers, the tests a Bonferroni E-value
+            corrects for; palindromes exist only for even k.
+    '''
+    return (4 ** k + (4 ** (k // 2) if k % 2 == 0 else 0)) // 2
+
+def log_erfc(x):
+    '''
+    Natural log of the complementary error function, vectorized.
+
+    Uses the Chebyshev fit of erfc from Numerical Recipes (fractional error
+    below 1.2e-7), which is already a log for x >= 0, so it stays finite far
+    past the point where erfc itself underflows.
+
+    Args:
+        x (np.ndarray): Any real values, infinities included.
+
+    Returns:
+        np.ndarray: log(erfc(x)).
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    z = np.abs(x)
+    t = 1 / (1 + 0.5 * z)
+    poly = 0.17087277
+    for c in (-0.82215223, 1.48851587, -1.13520398, 0.27886807, -0.18628806, 0.09678418,
+              0.37409196, 1.00002368, -1.26551223):
+        poly = c + t * poly
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_upper = np.where(np.isinf(z), -np.inf, np.log(t) - z * z + poly)
+    # erfc(-z) = 2 - erfc(z)
+    return np.where(x >= 0, log_upper, np.log(2 - np.exp(log_upper)))
+
+def log_gamma(x):
+    '''
+    Natural log of the gamma function for x > 0, vectorized (Lanczos, as
+    in Numerical Recipes, error below 2e-10).
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    tmp = x + 5.5
+    tmp = tmp - (x + 0.5) * np.log(tmp)
+    series = np.full_like(x, 1.000000000190015)
+    y = x.copy()
+    for c in (76.18009172947146, -86.50532032941677, 24.01409824083091,
+              -1.231739572450155, 0.1208650973866179e-2, -0.5395239384953e-5):
+        y += 1
+        series += c / y
+    return -tmp + np.log(2.5066282746310005 * series / x)
+
+def log_gamma_tails(a, x, eps=1e-12, max_iterations=1 << 20):
+    '''
+    Natural logs of the regularized incomplete gamma functions P(a, x) and
+    Q(a, x) = 1 - P(a, x), vectorized.
+
+    Below x = a + 1 the series for P converges and above it the continued
+    fraction for Q does (Numerical Recipes gser and gcf); the other one is
+    its complement, which is then at least about one half, so neither loses
+    precision. Each loop only carries the values that have not converged,
+    so a few large a do not slow down the rest.
+
+    Args:
+        a (np.ndarray): Shapes, > 0.
+        x (np.ndarray): Points, >= 0.
+        eps (float): Optional. Relative accuracy.
+        max_iterations (int): Optional. Safety bound for either loop.
+
+    Returns:
+        tuple: (log P, log Q) arrays.
+    '''
+    a, x = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(x, dtype=np.float64))
+    a, x = a.ravel(), x.ravel()
+    with np.errstate(divide='ignore'):
+        prefix = -x + a * np.log(x) - log_gamma(a)
+    prefix[x == 0] = -np.inf
+    log_direct = np.empty_like(x)
+    use_series = x < a + 1
+
+    # series for P
+    active = np.flatnonzero(use_series)
+    term = 1 / a[active]
+    total = term.copy()
+    shape = a[active].copy()
+    done_total = np.empty(len(active))
+    index = active
+    for _ in range(max_iterations):
+        if len(index) == 0:
+            break
+        shape += 1
+        term *= x[index] / shape
+        total += term
+        converged = np.abs(term) < np.abs(total) * eps
+        done_total[np.searchsorted(active, index[converged])] = total[converged]
+        keep = ~converged
+        index, term, total, shape = index[keep], term[keep], total[keep], shape[keep]
+    done_total[np.searchsorted(active, index)] = total
+    log_direct[active] = prefix[active] + np.log(done_total)
+
+    # continued fraction for Q, modified Lentz
+    active = np.flatnonzero(~use_series)
+    tiny = 1e-300
+    b = x[active] + 1 - a[active]
+    c = np.full(len(active), 1 / tiny)
+    d = 1 / b
+    h = d.copy()
+    done_h = np.empty(len(active))
+    index = active
+    for i in range(1, max_iterations):
+        if len(index) == 0:
+            break
+        an = -i * (i - a[index])
+        b += 2
+        d = an * d + b
+        d[np.abs(d) < tiny] = tiny
+        c = b + an / c
+        c[np.abs(c) < tiny] = tiny
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        converged = np.abs(delta - 1) < eps
+        done_h[np.searchsorted(active, index[converged])] = h[converged]
+        keep = ~converged
+        index, b, c, d, h = index[keep], b[keep], c[keep], d[keep], h[keep]
+    done_h[np.searchsorted(active, index)] = h
+    log_direct[active] = prefix[active] + np.log(done_h)
+
+    log_other = np.log1p(-np.exp(log_direct))
+    return np.where(use_series, log_direct, log_other), np.where(use_series, log_other, log_direct)
+
+def log_p_values(counts, expected, scores, poisson=False):
+    '''
+    Two sided P-values of observed counts, in natural logs.
+
+    The normal approximation is P = erfc(|z| / sqrt(2)), one log_erfc call
+    for the whole array. The exact Poisson test doubles the smaller tail,
+    P(X <= count) = Q(count + 1, expected) or P(X >= count) =
+    P(count, expected). Both are capped at 1.
+
+    Args:
+        counts (np.ndarray): Observed counts.
+        expected (np.ndarray): Expected counts.
+        scores (np.ndarray): Z-scores.
+        poisson (bool): Optional. Use the exact Poisson tails.
+
+    Returns:
+        np.ndarray: Natural log P-values.
+    '''
+    if not poisson:
+        return np.minimum(0.0, log_erfc(np.abs(scores) / np.sqrt(2)))
+    counts = np.asarray(counts, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    _, log_lower = log_gamma_tails(counts + 1, expected)
+    # P(X >= 0) = 1; the gamma function needs a shape above 0
+    log_upper, _ = log_gamma_tails(np.maximum(counts, 1), expected)
+    log_upper[counts == 0] = 0.0
+    return np.minimum(0.0, np.log(2) + np.minimum(log_lower, log_upper))
+
+def log_e_values(log_p, k):
+    '''
+    Returns:
+        np.ndarray: Natural log Bonferroni E-values, the P-values times
+            the number of canonical k-mers.
+    '''
+    return log_p + np.log(canonical_kmers(k))
+
+def scientific(log_values):
+    '''
+    Format natural log values as numbers in scientific notation, so values
+    far below the smallest float still print.
+
+    Returns:
+        list: Strings like '3.14e-1234'.
+    '''
+    log10 = np.asarray(log_values) / np.log(10)
+    exponent = np.floor(log10)
+    with np.errstate(invalid='ignore'):
+        mantissa = 10 ** (log10 - exponent)
+    # rounding can give 10.00
+    carry = mantissa >= 9.995
+    mantissa[carry] /= 10
+    exponent[carry] += 1
+    return [f'{m:.2f}e{int(e):+d}' if np.isfinite(e) else '0.00e+0'
+            for m, e in zip(mantissa.tolist(), exponent.tolist())]
+
+def merge_tables(tables):
+    '''
+    Add up count tables with one sort.
+
+    Args:
+        tables (list): (uint64 codes, int64 counts) pairs, codes unique
+            within each table.
+
+    Returns:
+        tuple: (sorted unique uint64 codes, int64 summed counts)
+    '''
+    tables = [table for table in tables if len(table[0])]
+    if not tables:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    if len(tables) == 1:
+        return tables[0]
+    codes = np.concatenate([codes for codes, _ in tables])
+    counts = np.concatenate([counts for _, counts in tables])
+    # the inputs are sorted runs, which the stable sort merges in near linear time
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    counts = np.add.reduceat(counts[order], starts)
+    # codes whose counts cancelled after a subtraction are gone
+    nonzero = counts != 0
+    return codes[starts][nonzero], counts[nonzero]
+
+def add_codes(counts, codes):
+    '''
+    Add one to a dense count array for every code.
+
+    A bincount over the whole array costs its full 4**k length, so it is
+    only used when the codes are a fair fraction of that; fewer codes, as
+    from a short record, are added in place and cost their own number.
+
+    Args:
+        counts (np.ndarray): int64 counts indexed by code, updated in place.
+        codes (np.ndarray): int64 codes below len(counts).
+    '''
+    if 16 * len(codes) >= len(counts):
+        counts += np.bincount(codes, minlength=len(counts))
+    else:
+        np.add.at(counts, codes, 1)
+
+class CountMinSketch:
+    '''
+    Count-Min sketch of k-mer codes with conservative update.
+
+    depth rows of width counters; a k-mer adds to one counter per row,
+    chosen by hashing its code and k, and its estimate is the smallest of
+    its counters. Conservative update only raises a counter as far as the
+    k-mer's new estimate, which keeps the overestimates from collisions
+    small. The memory is fixed, however many distinct k-mers are seen.
+    '''
+
+    def __init__(self, width, depth=4, seed=0):
+        '''
+        Constructor for CountMinSketch.
+
+        Args:
+            width (int): Counters per row.
+            depth (int): Optional. Rows, each with its own hash.
+            seed (int): Optional. Hash seed.
+        '''
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.salts = splitmix64(np.arange(1, depth + 1, dtype=np.uint64) + np.uint64(seed))
+
+    @classmethod
+    def of_size(cls, nbytes, depth=4):
+        '''
         Returns:
-            float: The E-value for the motif.
+            CountMinSketch: The widest sketch of depth rows that fits in
+                nbytes.
         '''
-        return round(self.pValue(s) * self.n, 2)
+        return cls(max(1, nbytes // (8 * depth)), depth)
+
+    def empty_copy(self):
+        '''
+        Returns:
+            CountMinSketch: Same shape and hashes, all counters zero.
+        '''
+        return CountMinSketch(self.width, self.depth, self.seed)
+
+    def cells(self, k, codes):
+        '''
+        Returns:
+            np.ndarray: (depth, len(codes)) counter columns of the codes.
+        '''
+        keys = codes.astype(np.uint64) + np.uint64(k * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF)
+        return (splitmix64(keys[None, :] ^ self.salts[:, None]) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, k, codes, counts):
+        '''
+        Add counts with conservative update.
+
+        Args:
+            k (int): The k-mer length.
+            codes (np.ndarray): Unique uint64 canonical codes.
+            counts (np.ndarray): Their counts.
+        '''
+        cells = self.cells(k, codes)
+        rows = np.broadcast_to(np.arange(self.depth)[:, None], cells.shape)
+        estimates = self.table[rows, cells].min(axis=0) + counts
+        np.maximum.at(self.table, (rows, cells), np.broadcast_to(estimates, cells.shape))
+
+    def query(self, k, codes):
+        '''
+        Returns:
+            np.ndarray: int64 estimates, never below the true counts.
+        '''
+        cells = self.cells(k, codes)
+        return self.table[np.arange(self.depth)[:, None], cells].min(axis=0)
+
+    def merge(self, other):
+        '''
+        Add another sketch of the same shape and seed; estimates stay upper
+        bounds of the combined counts.
+        '''
+        self.table += other.table
+
+def write_run(fname, codes, counts):
+    '''
+    Write a sorted run as raw fname.codes and fname.counts files.
+
+    Returns:
+        tuple: The run as read-only memory maps.
+    '''
+    codes.astype(np.uint64).tofile(fname + '.codes')
+    counts.astype(np.int64).tofile(fname + '.counts')
+    return open_run(fname, len(codes))
+
+def open_run(fname, length):
+    '''
+    Returns:
+        tuple: Memory mapped (uint64 codes, int64 counts) of a run written
+            by write_run, plain empty arrays for an empty run.
+    '''
+    if length == 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    return (np.memmap(fname + '.codes', dtype=np.uint64, mode='r', shape=(length,)),
+            np.memmap(fname + '.counts', dtype=np.int64, mode='r', shape=(length,)))
+
+def remove_run(codes, counts):
+    '''
+    Delete the files behind a memory mapped run.
+    '''
+    for part in (codes, counts):
+        if isinstance(part, np.memmap):
+            os.remove(part.filename)
+
+def merge_runs(runs, fname, max_memory=None):
+    '''
+    k-way merge of sorted runs into one run on disk.
+
+    Each step reads the next block of every run. Codes up to the smallest
+    last code among blocks that did not reach the end of their run are
+    complete, so those parts of the blocks are merged with merge_tables and
+    appended to the output; the rest waits for the next step. The run that
+    set the bound always moves a whole block, so every step makes progress.
+
+    Args:
+        runs (list): Sorted (codes, counts) runs, typically memory maps.
+        fname (str): Output prefix for write_run files.
+        max_memory (int): Optional. Bytes for the blocks in flight.
+
+    Returns:
+        tuple: Memory mapped (codes, counts) of the merged run.
+    '''
+    block = max(1 << 12, (max_memory or 1 << 28) // (64 * max(len(runs), 1)))
+    cursors = [0] * len(runs)
+    total = 0
+    with open(fname + '.codes', 'wb') as codesH, open(fname + '.counts', 'wb') as countsH:
+        while True:
+            live = [i for i, (codes, _) in enumerate(runs) if cursors[i] < len(codes)]
+            if not live:
+                break
+            ends = {i: min(cursors[i] + block, len(runs[i][0])) for i in live}
+            bounds = [runs[i][0][ends[i] - 1] for i in live if ends[i] < len(runs[i][0])]
+            bound = min(bounds) if bounds else None
+            pieces = []
+            for i in live:
+                codes, counts = runs[i]
+                stop = ends[i]
+                if bound is not None:
+                    stop = cursors[i] + int(np.searchsorted(codes[cursors[i]:stop], bound, side='right'))
+                pieces.append((np.asarray(codes[cursors[i]:stop]), np.asarray(counts[cursors[i]:stop])))
+                cursors[i] = stop
+            codes, counts = merge_tables(pieces)
+            codesH.write(codes.astype(np.uint64).tobytes())
+            countsH.write(counts.astype(np.int64).tobytes())
+            total += len(codes)
+    return open_run(fname, total)
+
+def split_sequence(sequence, chunk_size, overlap):
+    '''
+    Cut a sequence into pieces for count_parallel.
+
+    Args:
+        sequence (str or np.ndarray): Text or encodeSequence codes.
+        chunk_size (int): Bases owned by each piece.
+        overlap (int): Bases shared with the next piece, maxK - 1.
+
+    Yields:
+        tuple: (piece, limit) where limit is the number of leading positions
+            whose k-mers the piece counts, None for the whole piece.
+    '''
+    if len(sequence) <= chunk_size + overlap:
+        yield sequence, None
+        return
+    for start in range(0, len(sequence), chunk_size):
+        end = start + chunk_size + overlap
+        yield sequence[start:end], (chunk_size if end < len(sequence) else None)
+        if end >= len(sequence):
+            return
+
+def count_worker(genome, tasks, results):
+    '''
+    Worker process of Genome.count_parallel: count tasks from a queue until
+    a None arrives, then put the Genome, or the first error, on results.
+    After an error the remaining tasks are still taken off the queue, so
+    the parent never blocks on a full queue. Under a memory budget the
+    worker spills to a directory of its own and ends by spilling all its
+    runs, so only file names go back through the queue.
+
+    Args:
+        genome (Genome): An empty_copy to count into.
+        tasks (multiprocessing.Queue): Lists of (piece, limit) pairs.
+        results (multiprocessing.Queue): Receives one Genome or Exception.
+    '''
+    if genome.max_memory:
+        genome.spill_dir = tempfile.mkdtemp(prefix='worker', dir=genome.spill_dir)
+    error = None
+    for task in iter(tasks.get, None):
+        if error is not None:
+            continue
+        try:
+            for piece, limit in task:
+                genome.count_motifs(piece, limit)
+        except Exception as exc:
+            error = exc
+    if error is None and genome.max_memory:
+        genome.spill()
+    results.put(genome if error is None else error)
+
+complementTable = str.maketrans('ACGTN', 'TGCAN')
+digitTable = str.maketrans('ACGT', '0123')
+
+def motif_code(motif):
+    '''
+    Args:
+        motif (str): A k-mer over ACGT.
+
+    Returns:
+        int: Its 2 bit code, first base in the high bits.
+    '''
+    digits = motif.upper().translate(digitTable)
+    if digits.strip('0123'):
+        raise ValueError(f'{motif} has a base other than ACGT')
+    return int(digits, 4) if digits else 0
+
+def reverse_complement_codes(k):
+    '''
+    Args:
+        k (int): The k-mer length.
+
+    Returns:
+        np.ndarray: int64 array mapping every 2 bit k-mer code to the code
+            of its reverse complement.
+    '''
+    # a k-mer is its first base b then a (k-1)-mer r; its reverse
+    # complement is that of r followed by the complement of b, so row b of
+    # the table for k is the table for k - 1 shifted, or 3 - b
+    partner = np.zeros(1, dtype=np.int64)
+    complement = 3 - np.arange(4, dtype=np.int64)[:, None]
+    for _ in range(k):
+        partner = ((partner << 2) | complement).reshape(-1)
+    return partner
+
+def fold_strands(forward, k):
+    '''
+    Fold values indexed by forward strand code onto canonical k-mers.
+
+    Args:
+        forward (np.ndarray): Counts, or expectations, for all 4**k codes.
+        k (int): The k-mer length.
+
+    Returns:
+        np.ndarray: A canonical code (the smaller of a k-mer and its
+            reverse complement) holds the sum of both, a palindrome its own
+            value, every other code 0.
+    '''
+    partner = reverse_complement_codes(k)
+    folded = forward + forward[partner]
+    codes = np.arange(4 ** k)
+    folded[codes > partner] = 0
+    palindromes = codes == partner
+    folded[palindromes] = forward[palindromes]
+    return folded
+
+def reverse_codes(codes, k):
+    '''
+    Args:
+        codes (np.ndarray): uint64 k-mer codes.
+        k (int): The k-mer length.
+
+    Returns:
+        np.ndarray: uint64 codes of their reverse complements.
+    '''
+    codes = np.asarray(codes, dtype=np.uint64)
+    partner = np.zeros_like(codes)
+    for _ in range(k):
+        partner = (partner << np.uint64(2)) | (np.uint64(3) - (codes & np.uint64(3)))
+        codes = codes >> np.uint64(2)
+    return partner
+
+def code_motifs(codes, k):
+    '''
+    Args:
+        codes (np.ndarray): k-mer codes.
+        k (int): The k-mer length.
+
+    Returns:
+        list: The k-mers as strings, built with one table lookup for all.
+    '''
+    shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+    digits = (np.asarray(codes, dtype=np.uint64)[:, None] >> shifts) & np.uint64(3)
+    letters = np.frombuffer(b'ACGT', dtype=np.uint8)[digits.astype(np.intp)]
+    return np.ascontiguousarray(letters).view(f'S{k}').ravel().astype(f'U{k}').tolist()
+
+def code_motif(code, k):
+    '''
+    Args:
+        code (int): A 2 bit k-mer code.
+        k (int): The k-mer length.
+
+    Returns:
+        str: The k-mer as bases.
+    '''
+    return ''.join('ACGT'[(code >> (2 * (k - 1 - i))) & 3] for i in range(k))
 
 def reverse_complement(sequence):
     '''
@@ -171,37 +1444,94 @@ def reverse_complement(sequence):
     Returns:
         str: The reverse complement sequence.
     '''
-    complement = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-    return ''.join(complement[base] for base in sequence[::-1])
+    return sequence[::-1].translate(complementTable)
 
 def main(inFile=None, options=None):
     '''
     Main function for motif analysis.
 
     Args:
-        inFile (str): Optional. Input FastA file.
+        inFile (str or list): Optional. Input FastA file, or a list of files
+            and glob patterns whose records are counted together.
         options (list): Optional. List of command-line options and arguments.
     '''
     cl = CommandLine(options)
-    sourceReader = FastAreader(inFile)
-    thisGenome = Genome(cl.args.minMotif, cl.args.maxMotif)
-    
-    total_seqs = 0
-    for _, sequence in sourceReader.readFasta():
-        total_seqs += 1
-        thisGenome.count_motifs(sequence)
+    if cl.args.markov and cl.args.minMotif < 2:
+        cl.parser.error('--markov needs --minMotif of at least 2')
+    if cl.args.workers is not None and cl.args.workers < 0:
+        cl.parser.error('--workers needs a count of processes, 0 for one per core')
+
+    def read_sequences(source=inFile):
+        if isinstance(source, str) and not glob.has_magic(source):
+            return (sequence for _, sequence in FastAreader(source).readFasta(bulk=True, cache=cl.args.cache))
+        return (sequence for _, _, sequence
+                in MultiFastAreader(source).readFasta(ordered=False, cache=cl.args.cache))
 
-    z_scores = thisGenome.calculate_z_scores(total_seqs, cl.args.cutoff)
+    maxMemory = int(cl.args.maxMemory * 2 ** 20) if cl.args.maxMemory else None
+    sketchMemory = int(cl.args.sketch * 2 ** 20) if cl.args.sketch else None
+    # the Markov background of k needs the counts of k - 1 and k - 2
+    minK = max(1, cl.args.minMotif - 2) if cl.args.markov else cl.args.minMotif
+    stored = cl.args.store and os.path.exists(os.path.join(cl.args.store, Genome.store_meta))
+    if (cl.args.update or cl.args.retire or cl.args.mergeStore) and not stored:
+        cl.parser.error('--update, --retire and --mergeStore change an existing --store')
+    if cl.args.mergeStore and not os.path.exists(os.path.join(cl.args.mergeStore, Genome.store_meta)):
+        cl.parser.error(f'--mergeStore {cl.args.mergeStore} is not a count store')
+    denseMax = cl.args.denseMax
+    if stored:
+        # check before output.txt is opened that the store can answer
+        settings = Genome.store_settings(cl.args.store)
+        denseMax = settings['denseMaxK']
+        if minK < settings['minK'] or cl.args.maxMotif > settings['maxK']:
+            cl.parser.error(f"store {cl.args.store} holds k {settings['minK']} to {settings['maxK']}, "
+                            f"k {minK} to {cl.args.maxMotif} are needed")
+    if cl.args.markov and cl.args.maxMotif > denseMax:
+        cl.parser.error(f'--markov needs --maxMotif of at most the dense kMer size {denseMax}')
+    if cl.args.sketch and cl.args.store and not stored:
+        # save refuses sketch counts, so fail before both passes are spent
+        cl.parser.error('--sketch counts hold only the candidates of one cutoff and cannot make a new --store')
+    if stored:
+        if cl.args.update or cl.args.retire or cl.args.mergeStore:
+            # change the whole store, then score from it as usual
+            stored = Genome.open(cl.args.store)
+            if cl.args.update:
+                stored.total_seqs += stored.count_sequences(read_sequences(), cl.args.workers)
+            if cl.args.retire:
+                stored.subtract(read_sequences(cl.args.retire))
+            if cl.args.mergeStore:
+                stored.merge(Genome.open(cl.args.mergeStore))
+            stored.save(cl.args.store, stored.total_seqs)
+        # counted before: only the scoring and output are redone
+        thisGenome = Genome.open(cl.args.store, minK, cl.args.maxMotif)
+        total_seqs = thisGenome.total_seqs
+    else:
+        sequences = read_sequences()
+        if cl.args.sketch and inFile == '':
+            # standard input can only be read once, so hold on to the records
+            sequences = list(sequences)
+        thisGenome = Genome(minK, cl.args.maxMotif, cl.args.denseMax, cl.args.singlePass, maxMemory,
+                            sketch_memory=sketchMemory)
 
-    sorted_z_scores = sorted(z_scores.items(), key=lambda x: (len(x[0]), x[1]))
+        total_seqs = thisGenome.count_sequences(sequences, cl.args.workers)
+        if thisGenome.sketch is not None:
+            thisGenome.recount(sequences if isinstance(sequences, list) else read_sequences(),
+                               total_seqs, cl.args.cutoff, cl.args.workers)
+        if cl.args.store:
+            thisGenome.save(cl.args.store, total_seqs)
 
     with open("output.txt", 'w') as output_file:
-        output_file.write("sequence: reverse count Expect Zscore\n")
-        for motif, z_score in sorted_z_scores:
-            reverse_comp_motif = reverse_complement(motif)
-            count = thisGenome.motif_counts[motif]
-            expect = total_seqs / (4 ** len(motif))
-            output_file.write(f'{motif}:{reverse_comp_motif} {count} {expect:.2f} {z_score:.2f}\n')
+        output_file.write("sequence: reverse count Expect Zscore" + (" Pvalue Evalue\n" if cl.args.pvalues else "\n"))
+        # by k, then by increasing z-score, straight from the count tables
+        for k in range(cl.args.minMotif, cl.args.maxMotif + 1):
+            codes, counts, expected, scores = thisGenome.passing_scores(k, total_seqs, cl.args.cutoff,
+                                                                        cl.args.markov)
+            significance = [''] * len(codes)
+            if cl.args.pvalues:
+                log_p = log_p_values(counts, expected, scores, cl.args.pvalues == 'poisson')
+                significance = [f' {p} {e}' for p, e in zip(scientific(log_p), scientific(log_e_values(log_p, k)))]
+            for motif, reverse_comp_motif, count, expect, z_score, columns in zip(
+                    code_motifs(codes, k), code_motifs(reverse_codes(codes, k), k),
+                    counts.tolist(), expected.tolist(), scores.tolist(), significance):
+                output_file.write(f'{motif}:{reverse_comp_motif} {count} {expect:.2f} {z_score:.2f}{columns}\n')
 
 if __name__ == "__main__":
     main(inFile="Ecoli-UMN026.fa", options=["--minMotif=1", "--maxMotif=8", "--cutoff=-4.0"])